@@ -4,28 +4,65 @@ from app.services.whatsapp import WhatsAppService
 from app.services.image_analysis import ImageAnalysisService
 from app.services.emergency import EmergencyService
 from app.services.medical_assistant import MedicalAssistantService
-from app.models.schemas import WebhookResponse
+from app.services.message_queue import MessageQueue, QueueFullError
+from app.services.batch_dispatcher import BatchDispatcher
+from app.services.background import background_tasks
+from app.services.dedup import MessageDeduplicator
+from app.services.embeddings import EmbeddingService
+from app.services.vector_writer import VectorWriter
+from app.services.local_index import LocalVectorIndex, TieredVectorIndex
+from app.services.profile_store import PatientProfileStore
+from app.services.lexical_index import LexicalIndex
+from app.services.llm import get_llm_gateway
+from app.services.extraction import build_extraction_backend
+from app.services.fast_path import FastPathExtractor
+from app.services.chat_history import ChatHistoryStore, ChatSession
+from app.services.patient_purge import PatientDataPurger
+from app.services.history_compactor import HistoryCompactor
+from app.services.response_cache import (
+    SemanticResponseCache,
+    context_fingerprint,
+    is_self_contained,
+)
+from app.services.patients import patient_key
+from app.services.storage import get_storage_service
+from app.models.schemas import MessageResult, WebhookResponse
 from app.core.config import get_settings
+from app.core.redis import get_async_redis
 from langchain_openai import OpenAIEmbeddings, ChatOpenAI
-from groq import Groq
 from pinecone import Pinecone  # Add this import
 import os
-import asyncio
 import logging
-from langchain.memory import ConversationBufferMemory
-from langchain.memory.chat_message_histories import RedisChatMessageHistory
-import redis
-from typing import Dict
+from collections import OrderedDict
+from typing import Dict, List, Tuple
+import time
 
 router = APIRouter()
 settings = get_settings()
-groq_client = Groq(api_key=settings.GROQ_API_KEY)
-# Initialize Pinecone
-pinecone_client = Pinecone(api_key=settings.PINECONE_API_KEY)
-pinecone_index = pinecone_client.Index("medical-records")
+llm_gateway = get_llm_gateway()
 OPENAI_API_KEY = settings.OPENAI_API_KEY
 EMBEDDINGS_DIMENSIONS = 512
 
+
+def build_vector_index():
+    """Build the vector store selected by VECTOR_BACKEND"""
+    backend = settings.VECTOR_BACKEND.lower()
+    if backend == "local":
+        return LocalVectorIndex(settings.LOCAL_INDEX_DIR, dimension=EMBEDDINGS_DIMENSIONS)
+
+    # Initialize Pinecone
+    pinecone_client = Pinecone(api_key=settings.PINECONE_API_KEY)
+    remote_index = pinecone_client.Index("medical-records")
+    if backend == "tiered":
+        return TieredVectorIndex(
+            LocalVectorIndex(settings.LOCAL_INDEX_DIR, dimension=EMBEDDINGS_DIMENSIONS),
+            remote_index,
+        )
+    return remote_index
+
+
+pinecone_index = build_vector_index()
+
 # Initialize embedding service
 # Initialize OpenAI embeddings
 embedding_client = OpenAIEmbeddings(
@@ -34,42 +71,252 @@ embedding_client = OpenAIEmbeddings(
     dimensions=EMBEDDINGS_DIMENSIONS,
 )
 
+# Content-hash cache and micro-batcher in front of the OpenAI embeddings
+embedding_service = EmbeddingService(
+    embedding_client,
+    redis_client=get_async_redis() if settings.EMBEDDING_CACHE_USE_REDIS else None,
+    cache_size=settings.EMBEDDING_CACHE_SIZE,
+    redis_ttl_seconds=settings.EMBEDDING_CACHE_TTL_SECONDS,
+    batch_window_ms=settings.EMBEDDING_BATCH_WINDOW_MS,
+    max_batch_size=settings.EMBEDDING_MAX_BATCH_SIZE,
+)
+
+# Batches Pinecone upserts from every session; flushed by the app lifespan
+vector_writer = (
+    VectorWriter(
+        pinecone_index,
+        batch_size=settings.VECTOR_WRITE_BATCH_SIZE,
+        flush_interval_ms=settings.VECTOR_WRITE_FLUSH_INTERVAL_MS,
+        max_retries=settings.VECTOR_WRITE_MAX_RETRIES,
+        max_parallel_flushes=settings.VECTOR_WRITE_PARALLEL_FLUSHES,
+    )
+    if settings.VECTOR_WRITE_BEHIND
+    else None
+)
+
+# Per-patient entity counts and event log, updated on every processed message
+profile_store = (
+    PatientProfileStore(get_async_redis(), max_events=settings.PROFILE_MAX_EVENTS)
+    if settings.PROFILE_STORE_ENABLED
+    else None
+)
+
+# Remote (Groq) or local (llama.cpp) extraction; started by the app lifespan
+extraction_backend = build_extraction_backend(llm_gateway)
+
 # Initialize services
 whatsapp_service = WhatsAppService()
 image_service = ImageAnalysisService()
 emergency_service = EmergencyService()
 medical_assistant = MedicalAssistantService(
     pinecone_index=pinecone_index,
-    embedding_client=embedding_client,
-    groq_client=groq_client,
+    embedding_client=embedding_service,
+    llm=llm_gateway,
+    vector_writer=vector_writer,
+    profile_store=profile_store,
+    use_namespaces=settings.VECTOR_NAMESPACE_PER_PATIENT,
+    lexical_index=(
+        LexicalIndex(
+            max_patients=settings.LEXICAL_MAX_PATIENTS,
+            max_documents_per_patient=settings.LEXICAL_MAX_DOCUMENTS_PER_PATIENT,
+        )
+        if settings.LEXICAL_SEARCH_ENABLED
+        else None
+    ),
+    extraction_backend=extraction_backend,
+    fast_path=FastPathExtractor() if settings.FAST_PATH_ENABLED else None,
+    include_legacy_history=settings.HISTORY_INCLUDE_LEGACY,
 )
 
-# Initialize Redis client
-redis_client = redis.Redis(host="localhost", port=6379, db=0)
+# Drops Meta redeliveries before any paid API call is made
+deduplicator = MessageDeduplicator(
+    redis_client=get_async_redis() if settings.DEDUP_USE_REDIS else None,
+    ttl_seconds=settings.DEDUP_TTL_SECONDS,
+    max_entries=settings.DEDUP_MAX_ENTRIES,
+)
 
 
 class ConversationManager:
-    def __init__(self):
-        self.memories: Dict[str, ConversationBufferMemory] = {}
+    """LRU/TTL-bounded cache of per-patient chat sessions"""
 
-    def get_memory(self, phone_number: str) -> ConversationBufferMemory:
+    def __init__(
+        self,
+        store: ChatHistoryStore,
+        max_entries: int = 10000,
+        idle_ttl_seconds: float = 1800,
+    ):
+        self.store = store
+        self.max_entries = max_entries
+        self.idle_ttl_seconds = idle_ttl_seconds
+        # phone_number -> (memory, last access), least recently used first
+        self.memories: "OrderedDict[str, Tuple[ChatSession, float]]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def _evict(self, now: float):
+        while self.memories:
+            phone_number, (_, last_access) = next(iter(self.memories.items()))
+            if now - last_access > self.idle_ttl_seconds:
+                self.expirations += 1
+            elif len(self.memories) > self.max_entries:
+                self.evictions += 1
+            else:
+                break
+            self.memories.popitem(last=False)
+
+    def get_memory(self, phone_number: str) -> ChatSession:
         """Get or create memory for a user"""
-        if phone_number not in self.memories:
-            message_history = RedisChatMessageHistory(
-                url="redis://localhost:6379/0", session_id=f"chat:{phone_number}"
-            )
+        now = time.monotonic()
+        entry = self.memories.get(phone_number)
+        if entry is not None and now - entry[1] <= self.idle_ttl_seconds:
+            self.hits += 1
+            memory = entry[0]
+        else:
+            self.misses += 1
+            # Sessions share one pooled Redis client through the store
+            memory = ChatSession(phone_number, self.store)
+
+        self.memories[phone_number] = (memory, now)
+        self.memories.move_to_end(phone_number)
+        self._evict(now)
+        return memory
+
+    def discard(self, phone_number: str):
+        self.memories.pop(phone_number, None)
+
+    def stats(self) -> Dict[str, int]:
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self.memories),
+            "max_entries": self.max_entries,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+        }
 
-            self.memories[phone_number] = ConversationBufferMemory(
-                memory_key="chat_history",
-                chat_memory=message_history,
-                return_messages=True,
-            )
 
-        return self.memories[phone_number]
+# Initialize conversation manager
+conversation_manager = ConversationManager(
+    ChatHistoryStore(
+        get_async_redis(),
+        max_messages=settings.CHAT_HISTORY_MAX_MESSAGES,
+        ttl_seconds=settings.CHAT_HISTORY_TTL_SECONDS or None,
+    ),
+    max_entries=settings.CONVERSATION_CACHE_MAX_ENTRIES,
+    idle_ttl_seconds=settings.CONVERSATION_CACHE_IDLE_SECONDS,
+)
 
+# Rolling summary plus newest turns, so prompt size stays bounded
+history_compactor = HistoryCompactor(
+    get_async_redis(),
+    conversation_manager.store,
+    llm_gateway,
+    summarize_every=settings.HISTORY_SUMMARY_EVERY_TURNS,
+    token_budget=settings.HISTORY_TOKEN_BUDGET,
+    summary_max_tokens=settings.HISTORY_SUMMARY_MAX_TOKENS,
+)
 
-# Initialize conversation manager
-conversation_manager = ConversationManager()
+# Opt-in reply cache for near-identical questions from the same patient
+response_cache = (
+    SemanticResponseCache(
+        threshold=settings.RESPONSE_CACHE_THRESHOLD,
+        ttl_seconds=settings.RESPONSE_CACHE_TTL_SECONDS,
+        max_entries=settings.RESPONSE_CACHE_MAX_ENTRIES,
+        max_per_patient=settings.RESPONSE_CACHE_MAX_PER_PATIENT,
+    )
+    if settings.RESPONSE_CACHE_ENABLED
+    else None
+)
+
+# Per-patient "clear chat history"; the vector/image cascade runs in the background
+patient_purger = PatientDataPurger(
+    get_async_redis(),
+    conversation_manager.store,
+    embedding_service=embedding_service,
+    lexical_index=medical_assistant.lexical_index,
+    response_cache=response_cache,
+    vector_writer=vector_writer,
+    index=pinecone_index,
+    storage=get_storage_service(),
+    use_namespaces=settings.VECTOR_NAMESPACE_PER_PATIENT,
+    wait_timeout=settings.PURGE_WAIT_SECONDS,
+)
+
+CONTEXT_REPLY_PROMPT = "You're Matthew, a helpful AI medical assistant, you are given a medical context and a patient query, you need to respond to the user query based on the medical context. Speak to the patient as an AI assistant who has been texted by the patient. Be concise and to the point & considerate you only have 70 tokens to respond - you must be concise"
+
+
+async def generate_context_reply(processed_text) -> str:
+    """Write the patient-facing reply for an image or audio message"""
+    return await llm_gateway.complete(
+        model="llama-3.2-11b-vision-preview",
+        messages=[
+            {"role": "system", "content": CONTEXT_REPLY_PROMPT},
+            {"role": "user", "content": f"""{processed_text}"""},
+        ],
+        temperature=0.7,
+        max_tokens=100,
+        top_p=0.9,
+        stream=False,
+    )
+
+
+def use_combined_pipeline(text: str) -> bool:
+    """Short messages get extraction and reply from a single LLM call"""
+    return (
+        settings.PIPELINE_MODE == "combined"
+        and len(text) <= settings.COMBINED_PIPELINE_MAX_CHARS
+    )
+
+
+async def generate_text_reply(
+    phone_number: str, text: str, chat_history: str, query_embedding=None
+) -> str:
+    """Extract context, retrieve similar cases, then write the reply"""
+    processed_text = await medical_assistant.process_and_respond(
+        phone_number=phone_number,
+        query=text,
+        chat_history=chat_history,
+        query_embedding=query_embedding,
+    )
+
+    return await llm_gateway.complete(
+        model="llama-3.2-11b-vision-preview",
+        messages=[
+            {
+                "role": "system",
+                "content": "You're Matthew, a helpful AI medical assistant. Consider the conversation history and medical context to provide a personalized response. Speak to the patient in second person. Always refer to the context and only address the history if necessary - YOU ONLY HAVE 70 TOKENS TO RESPOND",
+            },
+            {
+                "role": "user",
+                "content": f"Chat History: {chat_history}\n\nCurrent Context: {processed_text}",
+            },
+        ],
+        temperature=0.7,
+        max_tokens=70,
+        top_p=0.9,
+        stream=False,
+    )
+
+
+async def response_cache_key(
+    phone_number: str, text: str
+) -> Tuple[str, List[float]]:
+    """Fingerprint of the patient's context plus the query embedding.
+
+    Only inputs that stay put between turns go into the fingerprint: the
+    rolling summary (refreshed every few turns) and the profile entities.
+    Follow-ups like "can I take it with food" depend on the raw turns and are
+    filtered out by ``is_self_contained`` before this is called. The query
+    embedding is handed on to the pipeline so it isn't computed twice.
+    """
+    vector = await embedding_service.aembed_query(text, owner=patient_key(phone_number))
+    summary = await history_compactor.get_summary(phone_number)
+    entities = await profile_store.get_entities(phone_number) if profile_store else []
+    return context_fingerprint(summary, entities), vector
 
 
 async def handle_text_message(message: dict, phone_number: str):
@@ -80,12 +327,17 @@ async def handle_text_message(message: dict, phone_number: str):
         # Get memory for this user
         memory = conversation_manager.get_memory(phone_number)
 
-        memory = conversation_manager.get_memory(phone_number)
-
         # Add clear chat history functionality
         if text == "clear chat history":
             try:
-                redis_client.flushall()
+                await memory.wait_for_writes()
+                await patient_purger.purge(phone_number)
+                conversation_manager.discard(phone_number)
+                if settings.PURGE_CASCADE_EXTERNAL:
+                    background_tasks.spawn(
+                        patient_purger.purge_external(phone_number),
+                        name=f"purge-external-{phone_number}",
+                    )
                 await whatsapp_service.send_message(
                     phone_number=phone_number,
                     message="Chat history has been cleared successfully.",
@@ -120,47 +372,77 @@ async def handle_text_message(message: dict, phone_number: str):
                 "Emergency services have been notified. Stay calm and wait for assistance.",
             )
         else:
-            # Save user message to memory
-            memory.save_context(
-                {"input": text}, {"output": "Processing your message..."}
-            )
-
-            # Get chat history
-            chat_history = memory.chat_memory.messages[-5:]  # Last 5 messages
-
-            # Process with context
-            processed_text = await medical_assistant.process_and_respond(
-                phone_number=phone_number, query=text, chat_history=chat_history
+            # Get chat history (only the last few entries are read from Redis)
+            # and compact it with the rolling summary under the token budget
+            chat_history = await history_compactor.build_context(
+                phone_number,
+                await memory.recent(
+                    max(settings.CHAT_HISTORY_WINDOW, history_compactor.min_window)
+                ),
             )
 
-            def call_groq():
-                return groq_client.chat.completions.create(
-                    model="llama-3.2-11b-vision-preview",
-                    messages=[
-                        {
-                            "role": "system",
-                            "content": "You're Matthew, a helpful AI medical assistant. Consider the conversation history and medical context to provide a personalized response. Speak to the patient in second person. Always refer to the context and only address the history if necessary - YOU ONLY HAVE 70 TOKENS TO RESPOND",
-                        },
-                        {
-                            "role": "user",
-                            "content": f"Chat History: {chat_history}\n\nCurrent Context: {processed_text}",
-                        },
-                    ],
-                    temperature=0.7,
-                    max_tokens=70,
-                    top_p=0.9,
-                    stream=False,
+            response_text = None
+            cache_key = None
+            if response_cache is not None and is_self_contained(text):
+                try:
+                    cache_key = await response_cache_key(phone_number, text)
+                    response_text = response_cache.lookup(phone_number, *cache_key)
+                except Exception as e:
+                    logging.error(f"Response cache lookup failed: {e}")
+            cache_hit = response_text is not None
+            query_embedding = cache_key[1] if cache_key is not None else None
+            if cache_hit:
+                # Only the reply is reused; the message still reaches history
+                background_tasks.spawn(
+                    medical_assistant.record_message(
+                        phone_number, text, chat_history, query_embedding
+                    ),
+                    name=f"record-message-{phone_number}",
+                    owner=phone_number,
                 )
 
-            loop = asyncio.get_event_loop()
-            response = await loop.run_in_executor(None, call_groq)
-            response_text = response.choices[0].message.content
+            if not cache_hit and use_combined_pipeline(text):
+                try:
+                    (
+                        medical_context,
+                        response_text,
+                    ) = await medical_assistant.extract_and_reply(text, chat_history)
+                    # The reply doesn't need the vector store; record it afterwards
+                    background_tasks.spawn(
+                        medical_assistant.record_interaction(
+                            phone_number=phone_number,
+                            query=text,
+                            medical_context=medical_context,
+                            chat_history=chat_history,
+                            query_embedding=query_embedding,
+                        ),
+                        name=f"record-interaction-{phone_number}",
+                        owner=phone_number,
+                    )
+                except Exception as e:
+                    logging.error(f"Combined pipeline failed, falling back: {e}")
+
+            if response_text is None:
+                response_text = await generate_text_reply(
+                    phone_number, text, chat_history, query_embedding
+                )
 
-            # Save assistant response to memory
-            memory.save_context({"input": text}, {"output": response_text})
+            if cache_key is not None and not cache_hit:
+                fingerprint, vector = cache_key
+                response_cache.store(
+                    phone_number, fingerprint, text, vector, response_text
+                )
 
             await whatsapp_service.send_message(phone_number, response_text)
 
+            # Commit the whole turn once the reply is on its way
+            memory.append_turn(text, response_text)
+            background_tasks.spawn(
+                history_compactor.record_turn(phone_number, memory),
+                name=f"history-compaction-{phone_number}",
+                owner=phone_number,
+            )
+
     except Exception as e:
         logging.error(f"Error handling text message: {e}")
         raise
@@ -169,43 +451,20 @@ async def handle_text_message(message: dict, phone_number: str):
 async def handle_image_message(message: dict, phone_number: str):
     """Handle incoming image messages"""
     try:
-        # Get image URL from WhatsApp
-        image_url = await whatsapp_service.get_media_url(message["image"]["id"])
-
-        # Download image
-        headers = {
-            "Authorization": f"Bearer {settings.WHATSAPP_API_KEY}",
-            "Content-Type": "application/json",
-        }
-        image_data = await image_service.download_image(image_url, headers)
+        # Resolve and download the image once; the buffer is shared downstream
+        media = await whatsapp_service.fetch_media(message["image"]["id"])
 
         # Analyze image
-        analysis = await image_service.analyze_medical_image(image_data, phone_number)
+        analysis = await image_service.analyze_medical_image(
+            media.data, phone_number, content_type=media.mime_type
+        )
         processed_text = await medical_assistant.process_and_respond(
-            phone_number=phone_number, query=analysis, image_url=image_url
+            phone_number=phone_number, query=analysis, image_url=media.url
         )
 
         # Send results
-        def call_groq():
-            return groq_client.chat.completions.create(
-                model="llama-3.2-11b-vision-preview",
-                messages=[
-                    {
-                        "role": "system",
-                        "content": "You're Matthew, a helpful AI medical assistant, you are given a medical context and a patient query, you need to respond to the user query based on the medical context. Speak to the patient as an AI assistant who has been texted by the patient. Be concise and to the point & considerate you only have 70 tokens to respond - you must be concise",
-                    },
-                    {"role": "user", "content": f"""{processed_text}"""},
-                ],
-                temperature=0.7,
-                max_tokens=100,
-                top_p=0.9,
-                stream=False,
-            )
-
-        loop = asyncio.get_event_loop()
-        response = await loop.run_in_executor(None, call_groq)
         await whatsapp_service.send_message(
-            phone_number, response.choices[0].message.content
+            phone_number, await generate_context_reply(processed_text)
         )
 
     except Exception as e:
@@ -241,26 +500,8 @@ async def handle_audio_message(message: dict, phone_number: str):
 
         # Send response back to user - modified to handle string response
         # Send results
-        def call_groq():
-            return groq_client.chat.completions.create(
-                model="llama-3.2-11b-vision-preview",
-                messages=[
-                    {
-                        "role": "system",
-                        "content": "You're Matthew, a helpful AI medical assistant, you are given a medical context and a patient query, you need to respond to the user query based on the medical context. Speak to the patient as an AI assistant who has been texted by the patient. Be concise and to the point & considerate you only have 70 tokens to respond - you must be concise",
-                    },
-                    {"role": "user", "content": f"""{processed_text}"""},
-                ],
-                temperature=0.7,
-                max_tokens=100,
-                top_p=0.9,
-                stream=False,
-            )
-
-        loop = asyncio.get_event_loop()
-        response = await loop.run_in_executor(None, call_groq)
         await whatsapp_service.send_message(
-            phone_number, response.choices[0].message.content
+            phone_number, await generate_context_reply(processed_text)
         )
 
     except Exception as e:
@@ -271,44 +512,135 @@ async def handle_audio_message(message: dict, phone_number: str):
         )
 
 
-@router.post("/webhook", response_model=WebhookResponse)
-async def webhook(request: Request):
-    """Handle incoming WhatsApp webhooks"""
+async def dispatch_message(message: dict, phone_number: str):
+    """Route a single WhatsApp message to its type handler"""
+    if message["type"] == "text":
+        await handle_text_message(message, phone_number)
+    elif message["type"] == "image":
+        await handle_image_message(message, phone_number)
+    elif message["type"] == "audio":
+        await handle_audio_message(message, phone_number)
+
+
+async def process_message(message: dict, phone_number: str):
+    """Dispatch a claimed message, releasing the claim if processing fails"""
     try:
-        body = await request.json()
+        await dispatch_message(message, phone_number)
+    except Exception:
+        await deduplicator.release(message.get("id"))
+        raise
 
-        if body.get("object") != "whatsapp_business_account":
-            raise HTTPException(status_code=400, detail="Invalid webhook object")
 
-        for entry in body.get("entry", []):
-            for change in entry.get("changes", []):
-                # Check if this is a message notification
-                if change.get("value", {}).get("messaging_product") != "whatsapp":
-                    continue
+# Per-phone queues used when WEBHOOK_ACK_FIRST is enabled; started by the app lifespan
+message_queue = MessageQueue(
+    handler=process_message,
+    max_concurrency=settings.WEBHOOK_WORKERS,
+    max_size=settings.WEBHOOK_QUEUE_SIZE,
+)
 
-                messages = change.get("value", {}).get("messages", [])
+# Inline fan-out used when WEBHOOK_ACK_FIRST is disabled
+batch_dispatcher = BatchDispatcher(
+    handler=process_message, max_concurrency=settings.WEBHOOK_MAX_CONCURRENCY
+)
 
-                # Skip if no messages or if it's a status update
-                if not messages or "status" in change.get("value", {}):
-                    continue
 
-                message = messages[0]
+def collect_messages(body: dict) -> List[dict]:
+    """Collect every user-initiated message across all entries and changes"""
+    collected = []
+    for entry in body.get("entry", []):
+        for change in entry.get("changes", []):
+            value = change.get("value", {})
+            # Check if this is a message notification
+            if value.get("messaging_product") != "whatsapp":
+                continue
+
+            # Skip status updates
+            if "status" in value:
+                continue
+
+            for message in value.get("messages", []):
                 # Ensure this is a user-initiated message
                 if not message.get("from") or message.get(
                     "context"
                 ):  # Skip replies/system messages
                     continue
+                collected.append(message)
+    return collected
+
 
-                phone_number = message["from"]
+async def filter_duplicates(
+    messages: List[dict],
+) -> Tuple[List[dict], List[MessageResult]]:
+    """Split messages into first deliveries and already-seen duplicates"""
+    if not settings.DEDUP_ENABLED:
+        return messages, []
+
+    fresh, duplicates = [], []
+    for message in messages:
+        if await deduplicator.claim(message.get("id")):
+            fresh.append(message)
+        else:
+            logging.info(f"Skipping duplicate message {message.get('id')}")
+            duplicates.append(
+                MessageResult(
+                    message_id=message.get("id"),
+                    phone_number=message["from"],
+                    status="duplicate",
+                )
+            )
+    return fresh, duplicates
+
+
+async def enqueue_messages(messages: List[dict]) -> List[MessageResult]:
+    """Hand messages to the message queue; it processes them in per-phone order"""
+    results = []
+    for message in messages:
+        phone_number = message["from"]
+        try:
+            message_queue.enqueue(message, phone_number)
+            status = "queued"
+        except QueueFullError as e:
+            logging.warning(f"Webhook backpressure: {e}")
+            await deduplicator.release(message.get("id"))
+            status = "rejected"
+        results.append(
+            MessageResult(
+                message_id=message.get("id"), phone_number=phone_number, status=status
+            )
+        )
+    return results
 
-                if message["type"] == "text":
-                    await handle_text_message(message, phone_number)
-                elif message["type"] == "image":
-                    await handle_image_message(message, phone_number)
-                elif message["type"] == "audio":
-                    await handle_audio_message(message, phone_number)
 
-        return WebhookResponse(status="success")
+@router.post("/webhook", response_model=WebhookResponse)
+async def webhook(request: Request):
+    """Handle incoming WhatsApp webhooks"""
+    try:
+        body = await request.json()
+
+        if body.get("object") != "whatsapp_business_account":
+            raise HTTPException(status_code=400, detail="Invalid webhook object")
+
+        messages, duplicates = await filter_duplicates(collect_messages(body))
+
+        if settings.WEBHOOK_ACK_FIRST:
+            # Acknowledge immediately; the worker pool does the processing
+            results = await enqueue_messages(messages)
+            if any(result.status == "rejected" for result in results):
+                # Non-2xx makes Meta redeliver the batch once we have capacity
+                raise HTTPException(status_code=503, detail="Message queue full")
+        else:
+            results = await batch_dispatcher.dispatch(messages)
+        results.extend(duplicates)
+
+        status = (
+            "error" if any(result.status == "error" for result in results) else "success"
+        )
+        return WebhookResponse(status=status, results=results)
+    except HTTPException as e:
+        if e.status_code == 503:
+            raise
+        logging.error(f"Webhook error: {e.detail}")
+        return WebhookResponse(status="error", message=str(e.detail))
     except Exception as e:
         logging.error(f"Webhook error: {e}", exc_info=True)
         return WebhookResponse(status="error", message=str(e))
@@ -326,3 +658,21 @@ async def verify_webhook(request: Request):
         return int(params.get("hub.challenge", 0))
 
     raise HTTPException(status_code=400, detail="Invalid verification token")
+
+
+@router.get("/webhook/stats")
+async def webhook_stats():
+    """Cache and background-work counters for capacity tuning"""
+    return {
+        "conversation_cache": conversation_manager.stats(),
+        "llm": llm_gateway.stats(),
+        "response_cache": response_cache.stats() if response_cache else None,
+        "fast_path": (
+            medical_assistant.fast_path.counts if medical_assistant.fast_path else None
+        ),
+        "background_tasks": {
+            "pending": background_tasks.pending,
+            "completed": background_tasks.completed,
+            "failed": background_tasks.failed,
+        },
+    }
@@ -1,5 +1,6 @@
 from pydantic_settings import BaseSettings
 from functools import lru_cache
+from typing import Dict, List
 
 
 class Settings(BaseSettings):
@@ -14,6 +15,133 @@ class Settings(BaseSettings):
     PINECONE_API_KEY: str
     AI_API_KEY: str
     REDIS_URL: str = "redis://localhost:6379/0"
+    REDIS_MAX_CONNECTIONS: int = 50
+    REDIS_SOCKET_TIMEOUT_SECONDS: float = 5.0
+
+    # Webhook processing
+    WEBHOOK_ACK_FIRST: bool = False
+    WEBHOOK_WORKERS: int = 8
+    WEBHOOK_QUEUE_SIZE: int = 1000
+    WEBHOOK_MAX_CONCURRENCY: int = 16
+
+    # Message de-duplication
+    DEDUP_ENABLED: bool = True
+    DEDUP_USE_REDIS: bool = True
+    DEDUP_TTL_SECONDS: int = 86400
+    DEDUP_MAX_ENTRIES: int = 100000
+
+    # Shared outbound HTTP client
+    HTTP2_ENABLED: bool = True
+    HTTP_MAX_CONNECTIONS: int = 100
+    HTTP_MAX_KEEPALIVE_CONNECTIONS: int = 20
+    HTTP_KEEPALIVE_EXPIRY_SECONDS: float = 30.0
+    HTTP_TIMEOUT_SECONDS: float = 30.0
+    HTTP_CONNECT_TIMEOUT_SECONDS: float = 5.0
+    MEDIA_MAX_BYTES: int = 16 * 1024 * 1024
+
+    # Media storage ("s3", "local" or "memory")
+    STORAGE_BACKEND: str = "s3"
+    LOCAL_STORAGE_DIR: str = "storage"
+    S3_MAX_POOL_CONNECTIONS: int = 20
+    S3_MULTIPART_THRESHOLD_MB: int = 8
+    S3_MULTIPART_CHUNKSIZE_MB: int = 8
+    S3_MAX_CONCURRENCY: int = 4
+
+    # LLM gateway (Groq)
+    LLM_MAX_CONCURRENCY: int = 32
+    LLM_MAX_CONNECTIONS: int = 64
+    LLM_TIMEOUT_SECONDS: float = 30.0
+    LLM_MAX_RETRIES: int = 2
+    LLM_DEADLINE_SECONDS: float = 20.0
+    LLM_ATTEMPT_TIMEOUT_SECONDS: float = 12.0
+    LLM_HEDGE_ENABLED: bool = True
+    LLM_HEDGE_PERCENTILE: float = 95
+    LLM_HEDGE_MIN_SAMPLES: int = 20
+    LLM_LATENCY_WINDOW: int = 200
+    LLM_BREAKER_FAILURE_THRESHOLD: int = 5
+    LLM_BREAKER_RECOVERY_SECONDS: float = 30.0
+    LLM_FALLBACK_MODELS: Dict[str, str] = {
+        "llama-3.2-90b-vision-preview": "llama-3.2-11b-vision-preview",
+        "llama-3.2-11b-vision-preview": "llama-3.1-8b-instant",
+    }
+    LLM_VISION_MODELS: List[str] = [
+        "llama-3.2-90b-vision-preview",
+        "llama-3.2-11b-vision-preview",
+    ]
+
+    # Text pipeline ("sequential" or "combined" extract + reply in one call)
+    PIPELINE_MODE: str = "sequential"
+    COMBINED_PIPELINE_MAX_CHARS: int = 280
+
+    # Embedding cache and micro-batching
+    EMBEDDING_CACHE_SIZE: int = 10000
+    EMBEDDING_CACHE_USE_REDIS: bool = True
+    EMBEDDING_CACHE_TTL_SECONDS: int = 7 * 24 * 3600
+    EMBEDDING_BATCH_WINDOW_MS: float = 5
+    EMBEDDING_MAX_BATCH_SIZE: int = 64
+
+    # Vector store ("pinecone", "local" or "tiered" local-in-front-of-Pinecone)
+    VECTOR_BACKEND: str = "pinecone"
+    LOCAL_INDEX_DIR: str = "vector_index"
+    LOCAL_INDEX_PERSIST_INTERVAL_SECONDS: float = 30.0
+    # Read pre-prefix (uuid id) records with a filtered query; prefer
+    # `namespace_migration --rewrite-ids` and leave this off
+    HISTORY_INCLUDE_LEGACY: bool = False
+    VECTOR_NAMESPACE_PER_PATIENT: bool = False
+
+    # Per-patient BM25 index fused with vector search
+    LEXICAL_SEARCH_ENABLED: bool = True
+    LEXICAL_MAX_PATIENTS: int = 10000
+    LEXICAL_MAX_DOCUMENTS_PER_PATIENT: int = 500
+
+    # Conversation session cache
+    CONVERSATION_CACHE_MAX_ENTRIES: int = 10000
+    CONVERSATION_CACHE_IDLE_SECONDS: float = 1800
+
+    # Chat history kept in Redis
+    # Messages, not turns; raised to 2 * HISTORY_SUMMARY_EVERY_TURNS if lower
+    CHAT_HISTORY_WINDOW: int = 12
+    CHAT_HISTORY_MAX_MESSAGES: int = 100
+    CHAT_HISTORY_TTL_SECONDS: int = 0
+
+    # Rolling conversation summary
+    HISTORY_SUMMARY_EVERY_TURNS: int = 6
+    HISTORY_TOKEN_BUDGET: int = 400
+    HISTORY_SUMMARY_MAX_TOKENS: int = 150
+
+    # Medical context extraction: "groq" or "llamacpp"
+    EXTRACTION_BACKEND: str = "groq"
+    EXTRACTION_MODEL: str = "llama-3.2-11b-vision-preview"
+    LLAMA_MODEL_PATH: str = ""
+    LLAMA_N_CTX: int = 2048
+    LLAMA_N_THREADS: int = 0
+    LLAMA_MAX_BATCH_SIZE: int = 8
+    LLAMA_MAX_TOKENS: int = 256
+
+    # Lexicon fast path ahead of LLM extraction
+    FAST_PATH_ENABLED: bool = True
+
+    # Semantic reply cache (opt-in)
+    RESPONSE_CACHE_ENABLED: bool = False
+    RESPONSE_CACHE_THRESHOLD: float = 0.95
+    RESPONSE_CACHE_TTL_SECONDS: float = 3600
+    RESPONSE_CACHE_MAX_ENTRIES: int = 10000
+    RESPONSE_CACHE_MAX_PER_PATIENT: int = 50
+
+    # "clear chat history" purge
+    PURGE_WAIT_SECONDS: float = 10.0
+    PURGE_CASCADE_EXTERNAL: bool = False
+
+    # Incrementally maintained patient profiles (Redis)
+    PROFILE_STORE_ENABLED: bool = True
+    PROFILE_MAX_EVENTS: int = 5000
+
+    # Write-behind vector upserts
+    VECTOR_WRITE_BEHIND: bool = True
+    VECTOR_WRITE_BATCH_SIZE: int = 100
+    VECTOR_WRITE_FLUSH_INTERVAL_MS: float = 200
+    VECTOR_WRITE_MAX_RETRIES: int = 3
+    VECTOR_WRITE_PARALLEL_FLUSHES: int = 4
 
     class Config:
         env_file = ".env"
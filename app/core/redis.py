@@ -0,0 +1,31 @@
+# app/core/redis.py
+from typing import Optional
+
+import redis.asyncio as aioredis
+
+from app.core.config import get_settings
+
+settings = get_settings()
+
+_async_client: Optional[aioredis.Redis] = None
+
+
+def get_async_redis() -> aioredis.Redis:
+    """Return the process-wide async Redis client, creating it on first use"""
+    global _async_client
+    if _async_client is None:
+        _async_client = aioredis.from_url(
+            settings.REDIS_URL,
+            max_connections=settings.REDIS_MAX_CONNECTIONS,
+            socket_timeout=settings.REDIS_SOCKET_TIMEOUT_SECONDS,
+            health_check_interval=30,
+        )
+    return _async_client
+
+
+async def close_async_redis():
+    """Close the shared async Redis client and its connection pool"""
+    global _async_client
+    if _async_client is not None:
+        await _async_client.aclose()
+        _async_client = None
@@ -1,8 +1,55 @@
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from app.api.routes import webhook
+from app.core.config import get_settings
+from app.core.http import close_http_client, init_http_client
+from app.core.redis import close_async_redis
+from app.services.background import background_tasks
+from app.services.llm import get_llm_gateway
+from app.services.local_index import persist_periodically
+from app.services.storage import get_storage_service
+import asyncio
 import logging
 
-app = FastAPI(title="Medical Assistant Bot")
+settings = get_settings()
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Start and stop background resources owned by the app"""
+    init_http_client()
+    await get_storage_service().health_check()
+    await webhook.extraction_backend.start()
+    if settings.WEBHOOK_ACK_FIRST:
+        webhook.message_queue.start()
+    if webhook.vector_writer is not None:
+        webhook.vector_writer.start()
+    persister = None
+    if hasattr(webhook.pinecone_index, "persist"):
+        # The local index is the primary store; don't rely on shutdown to save it
+        persister = asyncio.create_task(
+            persist_periodically(
+                webhook.pinecone_index, settings.LOCAL_INDEX_PERSIST_INTERVAL_SECONDS
+            ),
+            name="local-index-persist",
+        )
+    yield
+    if persister is not None:
+        persister.cancel()
+        await asyncio.gather(persister, return_exceptions=True)
+    await webhook.message_queue.stop()
+    await background_tasks.drain()
+    if webhook.vector_writer is not None:
+        await webhook.vector_writer.close()
+    if hasattr(webhook.pinecone_index, "persist"):
+        await asyncio.to_thread(webhook.pinecone_index.persist)
+    await webhook.extraction_backend.close()
+    await get_llm_gateway().aclose()
+    await close_async_redis()
+    await close_http_client()
+
+
+app = FastAPI(title="Medical Assistant Bot", lifespan=lifespan)
 
 
 # Include routers
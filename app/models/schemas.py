@@ -12,6 +12,14 @@ class WhatsAppMessage(BaseModel):
         from_attributes = True
 
 
+class MessageResult(BaseModel):
+    message_id: Optional[str] = None
+    phone_number: str
+    status: str
+    error: Optional[str] = None
+
+
 class WebhookResponse(BaseModel):
     status: str
     message: Optional[str] = None
+    results: Optional[List[MessageResult]] = None
@@ -0,0 +1,88 @@
+# app/services/background.py
+import asyncio
+import logging
+from typing import Awaitable, Dict, Optional, Set
+
+
+class BackgroundTaskTracker:
+    """Runs fire-and-forget coroutines while keeping a reference to each task.
+
+    Failures are logged and counted instead of disappearing with the task,
+    and ``drain`` lets shutdown wait for in-flight work. Tasks spawned with
+    an ``owner`` (a patient) can be awaited with ``wait_for_owner``.
+    """
+
+    def __init__(self):
+        self._tasks: Set[asyncio.Task] = set()
+        self._owned: Dict[str, Set[asyncio.Task]] = {}
+        self.completed = 0
+        self.failed = 0
+        self.last_error: Optional[str] = None
+
+    def spawn(
+        self, coro: Awaitable, name: Optional[str] = None, owner: Optional[str] = None
+    ) -> asyncio.Task:
+        task = asyncio.create_task(coro, name=name)
+        self._tasks.add(task)
+        if owner is not None:
+            self._owned.setdefault(owner, set()).add(task)
+            task.add_done_callback(lambda t: self._release(owner, t))
+        task.add_done_callback(self._on_done)
+        return task
+
+    def _release(self, owner: str, task: asyncio.Task):
+        tasks = self._owned.get(owner)
+        if tasks is not None:
+            tasks.discard(task)
+            if not tasks:
+                del self._owned[owner]
+
+    async def wait_for_owner(self, *owners: str, timeout: Optional[float] = 10.0) -> bool:
+        """Wait until no task of the given owners is running, including ones
+        they spawn meanwhile; returns False if timeout expired first"""
+        loop = asyncio.get_running_loop()
+        deadline = None if timeout is None else loop.time() + timeout
+        current = asyncio.current_task()
+        while True:
+            tasks = {
+                task
+                for owner in owners
+                for task in self._owned.get(owner, ())
+                if task is not current
+            }
+            if not tasks:
+                return True
+            remaining = None if deadline is None else deadline - loop.time()
+            if remaining is not None and remaining <= 0:
+                return False
+            await asyncio.wait(tasks, timeout=remaining)
+
+    def _on_done(self, task: asyncio.Task):
+        self._tasks.discard(task)
+        if task.cancelled():
+            return
+        error = task.exception()
+        if error is None:
+            self.completed += 1
+            return
+        self.failed += 1
+        self.last_error = f"{task.get_name()}: {error}"
+        logging.error(f"Background task {task.get_name()} failed: {error}", exc_info=error)
+
+    @property
+    def pending(self) -> int:
+        return len(self._tasks)
+
+    async def drain(self, timeout: Optional[float] = 10.0):
+        """Wait for in-flight tasks, cancelling whatever is left after timeout"""
+        if not self._tasks:
+            return
+        done, pending = await asyncio.wait(set(self._tasks), timeout=timeout)
+        for task in pending:
+            task.cancel()
+        if pending:
+            logging.warning(f"Cancelled {len(pending)} background tasks at shutdown")
+
+
+# Process-wide tracker shared by the services
+background_tasks = BackgroundTaskTracker()
@@ -0,0 +1,68 @@
+# app/services/batch_dispatcher.py
+import asyncio
+import logging
+from collections import OrderedDict
+from typing import Awaitable, Callable, Dict, List, Tuple
+
+from app.models.schemas import MessageResult
+
+
+MessageHandler = Callable[[dict, str], Awaitable[None]]
+
+
+class BatchDispatcher:
+    """Fan out every message of a webhook delivery.
+
+    Messages are grouped by sender; groups run concurrently (bounded by
+    ``max_concurrency``) while the messages inside a group run in order.
+    """
+
+    def __init__(self, handler: MessageHandler, max_concurrency: int = 16):
+        self.handler = handler
+        self.semaphore = asyncio.Semaphore(max(1, max_concurrency))
+
+    @staticmethod
+    def group_by_sender(messages: List[dict]) -> Dict[str, List[Tuple[int, dict]]]:
+        """Group (position, message) pairs by phone number, keeping arrival order"""
+        groups: Dict[str, List[Tuple[int, dict]]] = OrderedDict()
+        for position, message in enumerate(messages):
+            groups.setdefault(message["from"], []).append((position, message))
+        return groups
+
+    async def dispatch(self, messages: List[dict]) -> List[MessageResult]:
+        """Process all messages and return one outcome per message, in input order"""
+        results: List[MessageResult] = [None] * len(messages)
+        await asyncio.gather(
+            *(
+                self._run_sender(phone_number, group, results)
+                for phone_number, group in self.group_by_sender(messages).items()
+            )
+        )
+        return results
+
+    async def _run_sender(
+        self,
+        phone_number: str,
+        group: List[Tuple[int, dict]],
+        results: List[MessageResult],
+    ):
+        async with self.semaphore:
+            for position, message in group:
+                try:
+                    await self.handler(message, phone_number)
+                    results[position] = MessageResult(
+                        message_id=message.get("id"),
+                        phone_number=phone_number,
+                        status="processed",
+                    )
+                except Exception as e:
+                    logging.error(
+                        f"Error processing message {message.get('id')} from {phone_number}: {e}",
+                        exc_info=True,
+                    )
+                    results[position] = MessageResult(
+                        message_id=message.get("id"),
+                        phone_number=phone_number,
+                        status="error",
+                        error=str(e),
+                    )
@@ -0,0 +1,106 @@
+# app/services/chat_history.py
+import asyncio
+import json
+import logging
+from typing import List, Optional
+
+from app.services.background import background_tasks
+from langchain_core.messages import (
+    AIMessage,
+    BaseMessage,
+    HumanMessage,
+    message_to_dict,
+    messages_from_dict,
+)
+
+
+class ChatHistoryStore:
+    """Windowed chat history on a shared async Redis client.
+
+    Uses the same list layout as LangChain's ``RedisChatMessageHistory``
+    (``message_store:<session>``, newest message first), so existing
+    conversations stay readable. Reads fetch only the last N entries with
+    LRANGE and writes cap the list with LTRIM.
+    """
+
+    def __init__(
+        self,
+        redis_client,
+        max_messages: int = 100,
+        ttl_seconds: Optional[int] = None,
+        key_prefix: str = "message_store:",
+    ):
+        self.redis = redis_client
+        self.max_messages = max_messages
+        self.ttl_seconds = ttl_seconds
+        self.key_prefix = key_prefix
+
+    def key(self, phone_number: str) -> str:
+        return f"{self.key_prefix}chat:{phone_number}"
+
+    async def get_recent(self, phone_number: str, limit: int) -> List[BaseMessage]:
+        """Return the last ``limit`` messages, oldest first"""
+        if limit <= 0:
+            return []
+        raw_messages = await self.redis.lrange(self.key(phone_number), 0, limit - 1)
+        items = []
+        for raw in reversed(raw_messages):
+            try:
+                items.append(json.loads(raw))
+            except ValueError as e:
+                logging.error(f"Skipping malformed chat message for {phone_number}: {e}")
+        return messages_from_dict(items)
+
+    async def append_turn(self, phone_number: str, user_text: str, assistant_text: str):
+        """Commit a user message and its reply in one MULTI/EXEC round-trip"""
+        key = self.key(phone_number)
+        pipe = self.redis.pipeline(transaction=True)
+        pipe.lpush(
+            key,
+            json.dumps(message_to_dict(HumanMessage(content=user_text))),
+            json.dumps(message_to_dict(AIMessage(content=assistant_text))),
+        )
+        pipe.ltrim(key, 0, self.max_messages - 1)
+        if self.ttl_seconds:
+            pipe.expire(key, self.ttl_seconds)
+        await pipe.execute()
+
+
+class ChatSession:
+    """One patient's view of the shared chat history store.
+
+    Turn writes run in the background; the next read waits for the
+    outstanding write so a patient always sees their previous turn.
+    """
+
+    def __init__(self, phone_number: str, store: ChatHistoryStore):
+        self.phone_number = phone_number
+        self.store = store
+        self._pending_write: Optional[asyncio.Task] = None
+
+    async def wait_for_writes(self):
+        if self._pending_write is not None:
+            await asyncio.gather(self._pending_write, return_exceptions=True)
+            self._pending_write = None
+
+    async def recent(self, limit: int) -> List[BaseMessage]:
+        await self.wait_for_writes()
+        return await self.store.get_recent(self.phone_number, limit)
+
+    def append_turn(self, user_text: str, assistant_text: str) -> asyncio.Task:
+        """Schedule the turn write without blocking the caller"""
+        previous = self._pending_write
+        self._pending_write = background_tasks.spawn(
+            self._write_turn(previous, user_text, assistant_text),
+            name=f"chat-history-{self.phone_number}",
+            owner=self.phone_number,
+        )
+        return self._pending_write
+
+    async def _write_turn(
+        self, previous: Optional[asyncio.Task], user_text: str, assistant_text: str
+    ):
+        # Keep turns in order if an earlier write is still in flight
+        if previous is not None:
+            await asyncio.gather(previous, return_exceptions=True)
+        await self.store.append_turn(self.phone_number, user_text, assistant_text)
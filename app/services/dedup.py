@@ -0,0 +1,78 @@
+# app/services/dedup.py
+import logging
+import time
+from collections import OrderedDict
+from typing import Optional
+
+
+class MessageDeduplicator:
+    """Drop WhatsApp redeliveries by message id.
+
+    A bounded in-memory TTL/LRU set answers repeats seen by this process;
+    an optional Redis ``SET NX`` makes the claim visible to every worker.
+    """
+
+    def __init__(
+        self,
+        redis_client=None,
+        ttl_seconds: int = 86400,
+        max_entries: int = 100_000,
+        key_prefix: str = "wa:msg:",
+    ):
+        self.redis_client = redis_client
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.key_prefix = key_prefix
+        self._seen: "OrderedDict[str, float]" = OrderedDict()
+
+    def _evict(self, now: float):
+        # Entries share one TTL, so insertion order is also expiry order
+        while self._seen:
+            message_id, expires_at = next(iter(self._seen.items()))
+            if expires_at > now and len(self._seen) <= self.max_entries:
+                break
+            self._seen.popitem(last=False)
+
+    def _seen_locally(self, message_id: str, now: float) -> bool:
+        expires_at = self._seen.get(message_id)
+        return expires_at is not None and expires_at > now
+
+    def _remember(self, message_id: str, now: float):
+        self._seen[message_id] = now + self.ttl_seconds
+        self._seen.move_to_end(message_id)
+        self._evict(now)
+
+    async def claim(self, message_id: Optional[str]) -> bool:
+        """Return True if this is the first delivery of message_id, False for a duplicate"""
+        if not message_id:
+            return True
+
+        now = time.monotonic()
+        if self._seen_locally(message_id, now):
+            return False
+
+        if self.redis_client is not None:
+            try:
+                claimed = await self.redis_client.set(
+                    f"{self.key_prefix}{message_id}", 1, nx=True, ex=self.ttl_seconds
+                )
+                if not claimed:
+                    self._remember(message_id, now)
+                    return False
+            except Exception as e:
+                # Fail open: local de-duplication still applies
+                logging.error(f"Redis dedup error for {message_id}: {e}")
+
+        self._remember(message_id, now)
+        return True
+
+    async def release(self, message_id: Optional[str]):
+        """Forget a claim so a redelivery of a failed message is processed again"""
+        if not message_id:
+            return
+        self._seen.pop(message_id, None)
+        if self.redis_client is not None:
+            try:
+                await self.redis_client.delete(f"{self.key_prefix}{message_id}")
+            except Exception as e:
+                logging.error(f"Redis dedup release error for {message_id}: {e}")
@@ -0,0 +1,191 @@
+# app/services/embeddings.py
+import asyncio
+import hashlib
+import logging
+from array import array
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+
+from app.services.background import background_tasks
+
+
+class EmbeddingService:
+    """Caching, micro-batching front for an ``OpenAIEmbeddings`` client.
+
+    Vectors are cached by content hash in a local LRU and, optionally, in
+    Redis as packed float32 bytes. Cache misses that arrive within
+    ``batch_window_ms`` of each other are sent as one ``aembed_documents``
+    call, and identical in-flight texts share a single request. When an
+    ``owner`` is given, the Redis keys are also recorded in a per-owner set so
+    a patient's cached vectors can be purged without scanning the keyspace.
+    """
+
+    def __init__(
+        self,
+        client,
+        redis_client=None,
+        cache_size: int = 10000,
+        redis_ttl_seconds: int = 7 * 24 * 3600,
+        batch_window_ms: float = 5,
+        max_batch_size: int = 64,
+        key_prefix: str = "emb:",
+    ):
+        self.client = client
+        self.redis_client = redis_client
+        self.cache_size = cache_size
+        self.redis_ttl_seconds = redis_ttl_seconds
+        self.batch_window = batch_window_ms / 1000
+        self.max_batch_size = max_batch_size
+        model = getattr(client, "model", "embeddings")
+        dimensions = getattr(client, "dimensions", None) or ""
+        self.key_prefix = f"{key_prefix}{model}:{dimensions}:"
+        self.owner_prefix = f"{key_prefix}owners:"
+
+        self._cache: "OrderedDict[str, List[float]]" = OrderedDict()
+        self._pending: Dict[str, Tuple[str, asyncio.Future]] = {}
+        self._flush_handle: Optional[asyncio.TimerHandle] = None
+
+        self.hits = 0
+        self.misses = 0
+        self.batches = 0
+
+    def cache_key(self, text: str) -> str:
+        return self.key_prefix + hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+    def owner_key(self, owner: str) -> str:
+        return self.owner_prefix + owner
+
+    @staticmethod
+    def _pack(vector: List[float]) -> bytes:
+        return array("f", vector).tobytes()
+
+    @staticmethod
+    def _unpack(data: bytes) -> List[float]:
+        values = array("f")
+        values.frombytes(data)
+        return values.tolist()
+
+    def _cache_get(self, key: str) -> Optional[List[float]]:
+        vector = self._cache.get(key)
+        if vector is not None:
+            self._cache.move_to_end(key)
+        return vector
+
+    def _cache_put(self, key: str, vector: List[float]):
+        self._cache[key] = vector
+        self._cache.move_to_end(key)
+        while len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+
+    async def aembed_query(self, text: str, owner: Optional[str] = None) -> List[float]:
+        """Embed one text, served from cache or folded into the next batch"""
+        key = self.cache_key(text)
+        if owner and self.redis_client is not None:
+            background_tasks.spawn(
+                self._track_owner(owner, key), name="embedding-owner", owner=owner
+            )
+        vector = self._cache_get(key)
+        if vector is not None:
+            self.hits += 1
+            return vector
+
+        pending = self._pending.get(key)
+        if pending is not None:
+            return await asyncio.shield(pending[1])
+
+        future = asyncio.get_running_loop().create_future()
+        self._pending[key] = (text, future)
+        if len(self._pending) >= self.max_batch_size:
+            self._schedule_flush(0)
+        elif self._flush_handle is None:
+            self._schedule_flush(self.batch_window)
+        return await asyncio.shield(future)
+
+    async def aembed_documents(self, texts: List[str]) -> List[List[float]]:
+        return await asyncio.gather(*(self.aembed_query(text) for text in texts))
+
+    def _schedule_flush(self, delay: float):
+        if self._flush_handle is not None:
+            self._flush_handle.cancel()
+        loop = asyncio.get_running_loop()
+        self._flush_handle = loop.call_later(
+            delay, lambda: background_tasks.spawn(self._flush(), name="embedding-flush")
+        )
+
+    async def _flush(self):
+        self._flush_handle = None
+        batch, self._pending = self._pending, {}
+        if not batch:
+            return
+
+        try:
+            keys = list(batch)
+            resolved = await self._redis_lookup(keys)
+            self.hits += len(resolved)
+
+            missing = [key for key in keys if key not in resolved]
+            if missing:
+                self.misses += len(missing)
+                self.batches += 1
+                vectors = await self.client.aembed_documents(
+                    [batch[key][0] for key in missing]
+                )
+                fresh = dict(zip(missing, vectors))
+                resolved.update(fresh)
+                await self._redis_store(fresh)
+
+            for key, (_, future) in batch.items():
+                self._cache_put(key, resolved[key])
+                if not future.done():
+                    future.set_result(resolved[key])
+        except Exception as e:
+            logging.error(f"Error embedding batch of {len(batch)} texts: {e}")
+            for _, future in batch.values():
+                if not future.done():
+                    future.set_exception(e)
+
+    async def _redis_lookup(self, keys: List[str]) -> Dict[str, List[float]]:
+        if self.redis_client is None:
+            return {}
+        try:
+            values = await self.redis_client.mget(keys)
+        except Exception as e:
+            logging.error(f"Redis embedding cache read error: {e}")
+            return {}
+        return {key: self._unpack(value) for key, value in zip(keys, values) if value}
+
+    async def _redis_store(self, vectors: Dict[str, List[float]]):
+        if self.redis_client is None or not vectors:
+            return
+        try:
+            pipe = self.redis_client.pipeline(transaction=False)
+            for key, vector in vectors.items():
+                pipe.set(key, self._pack(vector), ex=self.redis_ttl_seconds)
+            await pipe.execute()
+        except Exception as e:
+            logging.error(f"Redis embedding cache write error: {e}")
+
+    async def _track_owner(self, owner: str, key: str):
+        try:
+            pipe = self.redis_client.pipeline(transaction=False)
+            pipe.sadd(self.owner_key(owner), key)
+            pipe.expire(self.owner_key(owner), self.redis_ttl_seconds)
+            await pipe.execute()
+        except Exception as e:
+            logging.error(f"Redis embedding owner tracking error: {e}")
+
+    async def purge_owner(self, owner: str) -> int:
+        """Drop every cached vector recorded for owner; returns keys removed"""
+        keys = []
+        if self.redis_client is not None:
+            owner_key = self.owner_key(owner)
+            keys = [
+                key.decode("utf-8") if isinstance(key, bytes) else key
+                for key in await self.redis_client.smembers(owner_key)
+            ]
+            for i in range(0, len(keys), 500):
+                await self.redis_client.unlink(*keys[i : i + 500])
+            await self.redis_client.unlink(owner_key)
+        for key in keys:
+            self._cache.pop(key, None)
+        return len(keys)
@@ -0,0 +1,258 @@
+# app/services/extraction.py
+import asyncio
+import json
+import logging
+import os
+from abc import ABC, abstractmethod
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional, Tuple
+
+from app.core.config import get_settings
+from app.services.llm import LLMGateway
+
+settings = get_settings()
+
+MEDICAL_CONTEXT_KEYS = ("conditions", "symptoms", "medications", "incidents", "body_parts")
+
+EXTRACTION_PROMPT = """You are a medical context analyzer. Extract and categorize medical information from the text into these categories:
+    - conditions: Any mentioned medical conditions
+    - symptoms: Reported symptoms or discomfort
+    - medications: Any medications mentioned
+    - incidents: Medical events or incidents
+    - body_parts: Mentioned body parts or areas
+    Respond only with a JSON object containing these categories."""
+
+# Shared by the grammar of the local backend and by validation
+MEDICAL_CONTEXT_SCHEMA = {
+    "type": "object",
+    "properties": {
+        key: {"type": "array", "items": {"type": "string"}} for key in MEDICAL_CONTEXT_KEYS
+    },
+    "required": list(MEDICAL_CONTEXT_KEYS),
+    "additionalProperties": False,
+}
+
+
+class ExtractionError(ValueError):
+    """Model output could not be read as a medical context object"""
+
+
+def coerce_medical_context(data) -> Dict[str, List[str]]:
+    """Validate a decoded object and keep only the five categories as string lists"""
+    if not isinstance(data, dict):
+        raise ExtractionError(f"Expected a JSON object, got {type(data).__name__}")
+    context = {}
+    for key in MEDICAL_CONTEXT_KEYS:
+        values = data.get(key) or []
+        if isinstance(values, (str, int, float, dict)):
+            values = [values]
+        if not isinstance(values, list):
+            raise ExtractionError(f"'{key}' must be a list")
+        items = []
+        for value in values:
+            if isinstance(value, dict):
+                value = value.get("name") or next(iter(value.values()), "")
+            if isinstance(value, (str, int, float)) and not isinstance(value, bool):
+                item = str(value).strip()
+                if item and item not in items:
+                    items.append(item)
+        context[key] = items
+    return context
+
+
+def parse_medical_context(raw: str) -> Dict[str, List[str]]:
+    """Strictly parse model output; never evaluates it"""
+    try:
+        data = json.loads(raw)
+    except (TypeError, ValueError) as e:
+        raise ExtractionError(f"Invalid JSON from extraction model: {e}")
+    return coerce_medical_context(data)
+
+
+class ExtractionBackend(ABC):
+    """Turns a patient message into the five-category medical context"""
+
+    async def start(self):
+        """Load models or open clients; called once at startup"""
+
+    async def close(self):
+        """Release resources; called on shutdown"""
+
+    @abstractmethod
+    async def extract(self, text: str) -> Dict[str, List[str]]:
+        """Medical context of one message, keyed by MEDICAL_CONTEXT_KEYS"""
+
+
+class GroqExtractionBackend(ExtractionBackend):
+    """Remote extraction through the shared LLM gateway"""
+
+    def __init__(self, llm: LLMGateway, model: str = "llama-3.2-11b-vision-preview"):
+        self.llm = llm
+        self.model = model
+
+    async def extract(self, text: str) -> Dict[str, List[str]]:
+        content = await self.llm.complete(
+            model=self.model,
+            messages=[
+                {"role": "system", "content": EXTRACTION_PROMPT},
+                {"role": "user", "content": text},
+            ],
+            temperature=0.3,
+            max_tokens=256,
+            top_p=0.9,
+            stream=False,
+            response_format={"type": "json_object"},
+        )
+        return parse_medical_context(content)
+
+
+class LlamaCppExtractionBackend(ExtractionBackend):
+    """Local GGUF model on CPU via llama-cpp-python.
+
+    The model is loaded once by ``start``. Output is constrained by a grammar
+    compiled from ``MEDICAL_CONTEXT_SCHEMA``, so it is always valid JSON of
+    the right shape. A llama.cpp context is not thread-safe, so requests are
+    queued and a single worker drains up to ``max_batch_size`` prompts at a
+    time and runs them back to back on one dedicated thread.
+    """
+
+    def __init__(
+        self,
+        model_path: str,
+        n_ctx: int = 2048,
+        n_threads: Optional[int] = None,
+        max_batch_size: int = 8,
+        max_tokens: int = 256,
+        queue_size: int = 256,
+    ):
+        self.model_path = model_path
+        self.n_ctx = n_ctx
+        self.n_threads = n_threads or os.cpu_count()
+        self.max_batch_size = max_batch_size
+        self.max_tokens = max_tokens
+        self.queue_size = queue_size
+
+        self._model = None
+        self._grammar = None
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="llama")
+        self._queue: Optional[asyncio.Queue] = None
+        self._worker: Optional[asyncio.Task] = None
+        self._batch: List[Tuple[str, asyncio.Future]] = []
+
+        self.batches = 0
+        self.completed = 0
+
+    def _load(self):
+        try:
+            from llama_cpp import Llama, LlamaGrammar
+        except ImportError as e:
+            raise RuntimeError(f"llama-cpp-python is required for local extraction: {e}")
+
+        self._model = Llama(
+            model_path=self.model_path,
+            n_ctx=self.n_ctx,
+            n_threads=self.n_threads,
+            verbose=False,
+        )
+        self._grammar = LlamaGrammar.from_json_schema(
+            json.dumps(MEDICAL_CONTEXT_SCHEMA), verbose=False
+        )
+
+    async def start(self):
+        if self._model is None:
+            loop = asyncio.get_running_loop()
+            await loop.run_in_executor(self._executor, self._load)
+        if self._worker is None:
+            self._queue = asyncio.Queue(maxsize=self.queue_size)
+            self._worker = asyncio.create_task(self._run(), name="llama-extraction")
+
+    async def close(self):
+        if self._worker is not None:
+            self._worker.cancel()
+            await asyncio.gather(self._worker, return_exceptions=True)
+            self._worker = None
+        pending = list(self._batch)
+        self._batch = []
+        if self._queue is not None:
+            while not self._queue.empty():
+                pending.append(self._queue.get_nowait())
+        for _, future in pending:
+            if not future.done():
+                future.set_exception(RuntimeError("Extraction backend closed"))
+        # A batch may still be running on the model thread; wait for it off the loop
+        await asyncio.to_thread(self._executor.shutdown, True)
+        self._model = None
+
+    async def extract(self, text: str) -> Dict[str, List[str]]:
+        if self._worker is None:
+            await self.start()
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put((text, future))
+        return parse_medical_context(await future)
+
+    def _complete(self, text: str) -> str:
+        completion = self._model.create_chat_completion(
+            messages=[
+                {"role": "system", "content": EXTRACTION_PROMPT},
+                {"role": "user", "content": text},
+            ],
+            grammar=self._grammar,
+            temperature=0.0,
+            max_tokens=self.max_tokens,
+        )
+        return completion["choices"][0]["message"]["content"]
+
+    def _complete_batch(self, texts: List[str]) -> List[Tuple[Optional[str], Optional[Exception]]]:
+        results = []
+        for text in texts:
+            try:
+                results.append((self._complete(text), None))
+            except Exception as e:
+                results.append((None, e))
+        return results
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self._queue.get()]
+            while len(batch) < self.max_batch_size and not self._queue.empty():
+                batch.append(self._queue.get_nowait())
+            # Kept on the instance so close() can fail it if we are cancelled
+            self._batch = batch
+
+            try:
+                results = await loop.run_in_executor(
+                    self._executor, self._complete_batch, [text for text, _ in batch]
+                )
+            except Exception as e:
+                logging.error(f"Local extraction batch failed: {e}")
+                results = [(None, e)] * len(batch)
+
+            self.batches += 1
+            for (_, future), (content, error) in zip(batch, results):
+                if future.done():
+                    continue
+                if error is not None:
+                    future.set_exception(error)
+                else:
+                    self.completed += 1
+                    future.set_result(content)
+            self._batch = []
+
+
+def build_extraction_backend(llm: LLMGateway) -> ExtractionBackend:
+    """Return the extraction backend selected by EXTRACTION_BACKEND"""
+    backend = settings.EXTRACTION_BACKEND.lower()
+    if backend == "groq":
+        return GroqExtractionBackend(llm, model=settings.EXTRACTION_MODEL)
+    if backend == "llamacpp":
+        if not settings.LLAMA_MODEL_PATH:
+            raise ValueError("LLAMA_MODEL_PATH must be set for the llamacpp backend")
+        return LlamaCppExtractionBackend(
+            settings.LLAMA_MODEL_PATH,
+            n_ctx=settings.LLAMA_N_CTX,
+            n_threads=settings.LLAMA_N_THREADS or None,
+            max_batch_size=settings.LLAMA_MAX_BATCH_SIZE,
+            max_tokens=settings.LLAMA_MAX_TOKENS,
+        )
+    raise ValueError(f"Unknown extraction backend: {settings.EXTRACTION_BACKEND}")
@@ -0,0 +1,162 @@
+# app/services/fast_path.py
+import re
+from collections import deque
+from dataclasses import dataclass, field
+from enum import Enum
+from typing import Dict, List, Optional, Tuple
+
+from app.services.lexical_index import STOPWORDS
+from app.services.medical_lexicon import CHITCHAT, FILLER, LEXICON, NEGATIONS
+
+_NON_WORD = re.compile(r"[^a-z0-9]+")
+
+# Words a greeting or thank-you may be padded with ("thank you", "thanks a lot")
+_SMALL_TALK = CHITCHAT | STOPWORDS | FILLER
+
+# Body parts and incidents alone are too ambiguous to skip the LLM
+_SUFFICIENT_CATEGORIES = frozenset(("conditions", "symptoms", "medications"))
+
+
+def normalize(text: str) -> str:
+    return _NON_WORD.sub(" ", (text or "").lower()).strip()
+
+
+class MessageKind(str, Enum):
+    NO_MEDICAL = "no_medical"
+    OBVIOUS = "obvious"
+    NEEDS_LLM = "needs_llm"
+
+
+@dataclass
+class FastPathResult:
+    kind: MessageKind
+    context: Dict[str, List[str]] = field(default_factory=dict)
+
+
+class AhoCorasick:
+    """Multi-pattern matcher over normalized text, matching whole words only"""
+
+    def __init__(self, patterns: Dict[str, str]):
+        # Node 0 is the root; goto[node][char] -> node
+        self._goto: List[Dict[str, int]] = [{}]
+        self._fail: List[int] = [0]
+        self._output: List[List[Tuple[str, str]]] = [[]]
+        for pattern, label in patterns.items():
+            self._add(pattern, label)
+        self._build()
+
+    def _add(self, pattern: str, label: str):
+        node = 0
+        # Padding with spaces makes every match start and end on a word boundary
+        for char in f" {pattern} ":
+            next_node = self._goto[node].get(char)
+            if next_node is None:
+                next_node = len(self._goto)
+                self._goto[node][char] = next_node
+                self._goto.append({})
+                self._fail.append(0)
+                self._output.append([])
+            node = next_node
+        self._output[node].append((pattern, label))
+
+    def _build(self):
+        queue = deque(self._goto[0].values())
+        while queue:
+            node = queue.popleft()
+            for char, child in self._goto[node].items():
+                queue.append(child)
+                fallback = self._fail[node]
+                while fallback and char not in self._goto[fallback]:
+                    fallback = self._fail[fallback]
+                target = self._goto[fallback].get(char, 0)
+                self._fail[child] = target if target != child else 0
+                self._output[child] = self._output[child] + self._output[self._fail[child]]
+
+    def find(self, text: str) -> List[Tuple[int, int, str, str]]:
+        """(start, end, pattern, label) for every match in normalized text"""
+        padded = f" {text} "
+        matches = []
+        node = 0
+        for position, char in enumerate(padded):
+            while node and char not in self._goto[node]:
+                node = self._fail[node]
+            node = self._goto[node].get(char, 0)
+            for pattern, label in self._output[node]:
+                end = position  # Index of the trailing space in padded text
+                start = end - len(pattern) - 1
+                matches.append((start, end - 1, pattern, label))
+        return matches
+
+
+class FastPathExtractor:
+    """Classifies messages with the bundled lexicon before any LLM call.
+
+    - ``NO_MEDICAL``: chit-chat ("hi", "thanks", "ok"), optionally padded
+      with stopwords and filler ("thank you", "i'm good thanks").
+    - ``OBVIOUS``: at least one condition, symptom or medication, plus only
+      other entities, stopwords and filler, with no negation; the context is
+      built from the matches.
+    - ``NEEDS_LLM``: anything else.
+    """
+
+    def __init__(self, lexicon: Optional[Dict[str, List[str]]] = None):
+        patterns = {}
+        for category, terms in (lexicon or LEXICON).items():
+            for term in terms:
+                patterns.setdefault(normalize(term), category)
+        self.matcher = AhoCorasick(patterns)
+
+        self.counts = {kind.value: 0 for kind in MessageKind}
+
+    def classify(self, text: str) -> FastPathResult:
+        result = self._classify(normalize(text))
+        self.counts[result.kind.value] += 1
+        return result
+
+    def _classify(self, normalized: str) -> FastPathResult:
+        tokens = normalized.split()
+        if not tokens or (
+            any(token in CHITCHAT for token in tokens)
+            and all(token in _SMALL_TALK for token in tokens)
+        ):
+            return FastPathResult(MessageKind.NO_MEDICAL)
+
+        matches = self._longest_matches(self.matcher.find(normalized))
+        if not any(match[3] in _SUFFICIENT_CATEGORIES for match in matches) or any(
+            token in NEGATIONS for token in tokens
+        ):
+            return FastPathResult(MessageKind.NEEDS_LLM)
+
+        covered = set()
+        for start, end, _, _ in matches:
+            covered.update(range(start, end))
+        position = 0
+        for token in tokens:
+            start = normalized.index(token, position)
+            position = start + len(token)
+            if start in covered or token.isdigit():
+                continue
+            if token not in STOPWORDS and token not in FILLER and token not in CHITCHAT:
+                return FastPathResult(MessageKind.NEEDS_LLM)
+
+        context = {category: [] for category in LEXICON}
+        for _, _, pattern, category in matches:
+            if pattern not in context[category]:
+                context[category].append(pattern)
+        return FastPathResult(MessageKind.OBVIOUS, context)
+
+    @staticmethod
+    def _longest_matches(matches):
+        """Drop matches inside a longer match of the same category ("pain" in "chest pain")"""
+        return [
+            match
+            for match in matches
+            if not any(
+                other is not match
+                and other[3] == match[3]
+                and other[0] <= match[0]
+                and match[1] <= other[1]
+                and (other[1] - other[0]) > (match[1] - match[0])
+                for other in matches
+            )
+        ]
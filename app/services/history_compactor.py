@@ -0,0 +1,178 @@
+# app/services/history_compactor.py
+import logging
+import math
+from typing import List, Optional, Set
+
+from app.services.patients import patient_key
+
+try:
+    import tiktoken
+except ImportError:  # Optional; token counts fall back to a length estimate
+    tiktoken = None
+
+SUMMARY_KEY_PREFIX = "summary:"
+
+SUMMARY_PROMPT = """You maintain a running summary of a conversation between a patient and a medical assistant.
+Update the existing summary with the new messages. Keep symptoms, conditions, medications, incidents, dates and open questions; drop greetings and small talk.
+Write plain prose in the third person, at most {max_words} words. Return only the summary."""
+
+_ROLE_LABELS = {"human": "Patient", "ai": "Assistant"}
+
+
+class TokenCounter:
+    """Counts prompt tokens with tiktoken when installed, else ~4 chars per token"""
+
+    def __init__(self, encoding: str = "cl100k_base"):
+        self._encoding = None
+        if tiktoken is not None:
+            try:
+                self._encoding = tiktoken.get_encoding(encoding)
+            except Exception as e:
+                logging.error(f"Falling back to estimated token counts: {e}")
+
+    def count(self, text: str) -> int:
+        if not text:
+            return 0
+        if self._encoding is not None:
+            return len(self._encoding.encode(text))
+        return math.ceil(len(text) / 4)
+
+    def truncate(self, text: str, max_tokens: int) -> str:
+        """Cut text to at most max_tokens, keeping the beginning"""
+        if self.count(text) <= max_tokens:
+            return text
+        if self._encoding is not None:
+            return self._encoding.decode(self._encoding.encode(text)[:max_tokens])
+        return text[: max_tokens * 4]
+
+
+def format_message(message) -> str:
+    role = _ROLE_LABELS.get(getattr(message, "type", ""), "Message")
+    return f"{role}: {message.content}"
+
+
+class HistoryCompactor:
+    """Rolling per-patient summary plus the newest raw turns, under a token budget.
+
+    The summary lives in Redis (``summary:<key>`` hash with the text and a
+    turn counter) and is refreshed in the background every
+    ``summarize_every`` turns from the previous summary and the turns since.
+    ``build_context`` never calls the LLM, so it adds one Redis read per turn.
+    """
+
+    def __init__(
+        self,
+        redis_client,
+        chat_store,
+        llm,
+        model: str = "llama-3.2-11b-vision-preview",
+        summarize_every: int = 6,
+        token_budget: int = 400,
+        summary_max_tokens: int = 150,
+        token_counter: Optional[TokenCounter] = None,
+    ):
+        self.redis = redis_client
+        self.chat_store = chat_store
+        self.llm = llm
+        self.model = model
+        self.summarize_every = summarize_every
+        self.token_budget = token_budget
+        self.summary_max_tokens = summary_max_tokens
+        self.tokens = token_counter or TokenCounter()
+        self._refreshing: Set[str] = set()
+
+        self.refreshes = 0
+        self.refresh_failures = 0
+
+    @property
+    def min_window(self) -> int:
+        """Messages to read so turns not yet summarized stay in the raw window"""
+        # Up to summarize_every turns (two messages each) can be pending
+        return 2 * self.summarize_every
+
+    @staticmethod
+    def summary_key(phone_number: str) -> str:
+        return f"{SUMMARY_KEY_PREFIX}{patient_key(phone_number)}"
+
+    async def get_summary(self, phone_number: str) -> str:
+        try:
+            summary = await self.redis.hget(self.summary_key(phone_number), "text")
+        except Exception as e:
+            logging.error(f"Error reading summary for {phone_number}: {e}")
+            return ""
+        if isinstance(summary, bytes):
+            summary = summary.decode("utf-8")
+        return summary or ""
+
+    async def build_context(self, phone_number: str, messages: List) -> str:
+        """Summary plus as many of the newest messages as fit the token budget"""
+        summary = self.tokens.truncate(
+            await self.get_summary(phone_number), self.summary_max_tokens
+        )
+        remaining = self.token_budget - self.tokens.count(summary)
+
+        recent = []
+        for message in reversed(messages or []):
+            line = format_message(message)
+            cost = self.tokens.count(line) + 1
+            if cost > remaining:
+                break
+            recent.append(line)
+            remaining -= cost
+        recent.reverse()
+
+        parts = []
+        if summary:
+            parts.append(f"Summary of earlier conversation: {summary}")
+        if recent:
+            parts.append("Recent messages:\n" + "\n".join(recent))
+        return "\n".join(parts)
+
+    async def record_turn(self, phone_number: str, session=None):
+        """Count a completed turn and refresh the summary every K turns"""
+        if session is not None:
+            # The refresh reads the turn back from the chat store
+            await session.wait_for_writes()
+        turns = await self.redis.hincrby(self.summary_key(phone_number), "turns", 1)
+        if turns % self.summarize_every == 0:
+            await self.refresh(phone_number)
+
+    async def refresh(self, phone_number: str):
+        if phone_number in self._refreshing:
+            return
+        self._refreshing.add(phone_number)
+        try:
+            previous = await self.get_summary(phone_number)
+            messages = await self.chat_store.get_recent(
+                phone_number, self.summarize_every * 2
+            )
+            if not messages:
+                return
+            transcript = "\n".join(format_message(message) for message in messages)
+            summary = await self.llm.complete(
+                model=self.model,
+                messages=[
+                    {
+                        "role": "system",
+                        "content": SUMMARY_PROMPT.format(
+                            max_words=int(self.summary_max_tokens * 0.75)
+                        ),
+                    },
+                    {
+                        "role": "user",
+                        "content": f"Existing summary: {previous or 'None'}\n\nNew messages:\n{transcript}",
+                    },
+                ],
+                temperature=0.2,
+                max_tokens=self.summary_max_tokens,
+                stream=False,
+            )
+            await self.redis.hset(
+                self.summary_key(phone_number), "text", summary.strip()
+            )
+            self.refreshes += 1
+        except Exception as e:
+            self.refresh_failures += 1
+            logging.error(f"Error refreshing summary for {phone_number}: {e}")
+        finally:
+            self._refreshing.discard(phone_number)
@@ -0,0 +1,109 @@
+# app/services/history_reader.py
+import asyncio
+import logging
+from typing import AsyncIterator, Dict, Iterator, List, Optional
+
+from app.services.patients import record_id_prefix
+
+
+class HistoryReader:
+    """Streams one patient's records from the vector index in date order.
+
+    Ids are listed by the patient's id prefix one page at a time; the index
+    returns them in lexicographic order, which the zero-padded timestamp in
+    the id makes chronological. Each page is fetched and yielded before the
+    next is listed, so memory stays bounded by ``page_size`` records.
+
+    Records written before prefixed ids existed are only read when
+    ``include_legacy`` is set; ``namespace_migration --rewrite-ids``
+    converts them once instead.
+    """
+
+    def __init__(
+        self,
+        index,
+        page_size: int = 100,
+        include_legacy: bool = False,
+        legacy_limit: int = 1000,
+        dimension: int = 512,
+    ):
+        self.index = index
+        self.page_size = page_size
+        self.include_legacy = include_legacy
+        self.legacy_limit = legacy_limit
+        self.dimension = dimension
+
+    def _namespace_kwargs(self, namespace: Optional[str]) -> Dict:
+        return {"namespace": namespace} if namespace else {}
+
+    def _list_ids(self, phone_number: str, namespace: Optional[str]) -> List[str]:
+        ids = []
+        for page in self.index.list(
+            prefix=record_id_prefix(phone_number),
+            limit=self.page_size,
+            **self._namespace_kwargs(namespace),
+        ):
+            ids.extend(page)
+        return ids
+
+    def _id_pages(self, phone_number: str, namespace: Optional[str]) -> Iterator[List[str]]:
+        return iter(
+            self.index.list(
+                prefix=record_id_prefix(phone_number),
+                limit=self.page_size,
+                **self._namespace_kwargs(namespace),
+            )
+        )
+
+    def _legacy_records(self, phone_number: str, namespace: Optional[str]) -> List[Dict]:
+        """Records written before prefixed ids existed, found by metadata filter"""
+        probe = [0.0] * self.dimension
+        probe[0] = 1.0  # Scores are irrelevant; cosine needs a non-zero vector
+        results = self.index.query(
+            vector=probe,
+            top_k=self.legacy_limit,
+            filter={"phone_number": {"$eq": phone_number}},
+            include_values=False,
+            include_metadata=True,
+            **self._namespace_kwargs(namespace),
+        )
+        prefix = record_id_prefix(phone_number)
+        return [
+            {"id": match.id, **(match.metadata or {})}
+            for match in results.matches
+            if not match.id.startswith(prefix)
+        ]
+
+    async def list_ids(self, phone_number: str, namespace: Optional[str] = None) -> List[str]:
+        """All of a patient's record ids, oldest first"""
+        ids = await asyncio.to_thread(self._list_ids, phone_number, namespace)
+        return sorted(ids)
+
+    async def stream(
+        self, phone_number: str, namespace: Optional[str] = None
+    ) -> AsyncIterator[Dict]:
+        """Yield each record's metadata (plus ``id``), oldest first"""
+        if self.include_legacy:
+            try:
+                legacy = await asyncio.to_thread(
+                    self._legacy_records, phone_number, namespace
+                )
+            except Exception as e:
+                logging.error(f"Error reading legacy records for {phone_number}: {e}")
+                legacy = []
+            for record in sorted(legacy, key=lambda r: r.get("date", "")):
+                yield record
+
+        pages = await asyncio.to_thread(self._id_pages, phone_number, namespace)
+        while True:
+            page = await asyncio.to_thread(next, pages, None)
+            if page is None:
+                break
+            page = sorted(page)
+            response = await asyncio.to_thread(
+                self.index.fetch, ids=page, **self._namespace_kwargs(namespace)
+            )
+            for vector_id in page:
+                vector = response.vectors.get(vector_id)
+                if vector is not None:
+                    yield {"id": vector_id, **(vector.metadata or {})}
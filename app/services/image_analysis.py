@@ -1,11 +1,9 @@
 # app/services/image_analysis.py
 from datetime import datetime
 import logging
-from groq import Groq
-import aiohttp
 from app.core.config import get_settings
-from app.services.storage import S3Service
-import asyncio
+from app.services.llm import LLMGateway, get_llm_gateway
+from app.services.storage import StorageService, get_storage_service
 
 settings = get_settings()
 
@@ -54,17 +52,13 @@ Provide your analysis in a clear, organized format."""
 
 
 class ImageAnalysisService:
-    def __init__(self):
-        self.groq_client = Groq(api_key=settings.GROQ_API_KEY)
-        self.s3_service = S3Service()
+    def __init__(self, storage: StorageService = None, llm: LLMGateway = None):
+        self.llm = llm or get_llm_gateway()
+        self.storage = storage or get_storage_service()
 
-    async def download_image(self, url: str, headers: dict) -> bytes:
-        """Download image from URL"""
-        async with aiohttp.ClientSession() as session:
-            async with session.get(url, headers=headers) as response:
-                return await response.read()
-
-    async def analyze_medical_image(self, image_data: bytes, phone_number: str) -> str:
+    async def analyze_medical_image(
+        self, image_data: bytes, phone_number: str, content_type: str = "image/jpeg"
+    ) -> str:
         """Analyze medical image using Llama-3 Vision via Groq"""
         try:
             # Generate unique filename
@@ -72,42 +66,35 @@ class ImageAnalysisService:
             key = f"health_images/{phone_number}/{timestamp}.jpg"
 
             # Upload to S3 and get URL
-            image_url = await self.s3_service.upload_file(
-                key=key, data=image_data, content_type="image/jpeg"
+            image_url = await self.storage.upload_file(
+                key=key, data=image_data, content_type=content_type
             )
 
-            # Run Groq API call in a thread pool
-            def call_groq():
-                return self.groq_client.chat.completions.create(
-                    model="llama-3.2-90b-vision-preview",
-                    messages=[
-                        {
-                            "role": "user",
-                            "content": [
-                                {
-                                    "type": "text",
-                                    "text": "Analyze this medical image and extract relevant medical information. You are a third person taking clinical notes.",
-                                },
-                                {
-                                    "type": "image_url",
-                                    "image_url": {
-                                        "url": image_url,
-                                        "detail": "high",
-                                    },
+            return await self.llm.complete(
+                model="llama-3.2-90b-vision-preview",
+                messages=[
+                    {
+                        "role": "user",
+                        "content": [
+                            {
+                                "type": "text",
+                                "text": "Analyze this medical image and extract relevant medical information. You are a third person taking clinical notes.",
+                            },
+                            {
+                                "type": "image_url",
+                                "image_url": {
+                                    "url": image_url,
+                                    "detail": "high",
                                 },
-                            ],
-                        }
-                    ],
-                    temperature=0.7,
-                    max_tokens=256,
-                    top_p=0.9,
-                    stream=False,
-                )
-
-            # Use asyncio to run the synchronous code in a thread pool
-            loop = asyncio.get_event_loop()
-            completion = await loop.run_in_executor(None, call_groq)
-            return completion.choices[0].message.content
+                            },
+                        ],
+                    }
+                ],
+                temperature=0.7,
+                max_tokens=256,
+                top_p=0.9,
+                stream=False,
+            )
 
         except Exception as e:
             logging.error(f"Error analyzing image: {e}")
@@ -0,0 +1,214 @@
+# app/services/lexical_index.py
+import math
+import re
+import threading
+from collections import Counter, OrderedDict
+from typing import Dict, Iterable, List, Optional, Sequence, Set, Tuple
+
+from app.services.vector_writer import VectorMatch
+
+TOKEN_PATTERN = re.compile(r"[a-z0-9]+")
+
+STOPWORDS = frozenset(
+    "a an and are as at be been but by can could did do does for from had has have "
+    "i i'm im in is it its me my of on or so that the their them then there these "
+    "they this to was we were what when where which who will with would you your".split()
+)
+
+
+def tokenize(text: str) -> List[str]:
+    return [
+        token
+        for token in TOKEN_PATTERN.findall((text or "").lower())
+        if token not in STOPWORDS
+    ]
+
+
+def reciprocal_rank_fusion(
+    result_lists: Sequence[Sequence], top_k: int, k: int = 60
+) -> list:
+    """Fuse ranked match lists by reciprocal rank; keeps the first match object per id"""
+    scores: Dict[str, float] = {}
+    first_seen: Dict[str, object] = {}
+    for results in result_lists:
+        for rank, match in enumerate(results, 1):
+            scores[match.id] = scores.get(match.id, 0.0) + 1.0 / (k + rank)
+            first_seen.setdefault(match.id, match)
+    ranked = sorted(scores, key=scores.get, reverse=True)
+    return [first_seen[match_id] for match_id in ranked[:top_k]]
+
+
+class BM25Index:
+    """BM25 over one patient's records (content plus extracted entities).
+
+    With ``max_documents`` set, only that many records are kept; record ids
+    sort by creation time, so the smallest id is evicted first.
+    """
+
+    def __init__(
+        self,
+        k1: float = 1.5,
+        b: float = 0.75,
+        entity_weight: int = 2,
+        max_documents: Optional[int] = None,
+    ):
+        self.k1 = k1
+        self.b = b
+        self.entity_weight = entity_weight
+        self.max_documents = max_documents
+        # doc id -> (term frequencies, length, metadata, entity phrases)
+        self.documents: Dict[str, Tuple[Counter, int, Dict, List[str]]] = {}
+        self.document_frequency: Counter = Counter()
+        self.total_length = 0
+        # Entity phrase -> ids of the records that mention it
+        self.entities: Dict[str, Set[str]] = {}
+
+    def __len__(self):
+        return len(self.documents)
+
+    def add(self, doc_id: str, content: str, entities: Iterable[str], metadata: Dict):
+        if doc_id in self.documents:
+            return
+        if self.max_documents and len(self.documents) >= self.max_documents:
+            oldest = min(self.documents)
+            if doc_id < oldest:
+                return
+            self.remove(oldest)
+        entities = [e for e in (entity.strip().lower() for entity in entities) if e]
+        tokens = tokenize(content)
+        for entity in entities:
+            entity_tokens = tokenize(entity)
+            if not entity_tokens:
+                continue
+            tokens.extend(entity_tokens * self.entity_weight)
+            self.entities.setdefault(entity, set()).add(doc_id)
+
+        term_frequency = Counter(tokens)
+        self.documents[doc_id] = (term_frequency, len(tokens), metadata, entities)
+        self.document_frequency.update(term_frequency.keys())
+        self.total_length += len(tokens)
+
+    def remove(self, doc_id: str):
+        term_frequency, length, _, entities = self.documents.pop(doc_id)
+        self.document_frequency.subtract(term_frequency.keys())
+        for term in term_frequency:
+            if self.document_frequency[term] <= 0:
+                del self.document_frequency[term]
+        self.total_length -= length
+        for entity in entities:
+            ids = self.entities.get(entity)
+            if ids is not None:
+                ids.discard(doc_id)
+                if not ids:
+                    del self.entities[entity]
+
+    def exact_entities(self, text: str) -> Set[str]:
+        """Known entity phrases that appear verbatim (on word boundaries) in text"""
+        padded = f" {' '.join(tokenize(text))} "
+        return {entity for entity in self.entities if f" {' '.join(tokenize(entity))} " in padded}
+
+    def search(self, query: str, top_k: int = 3) -> List[VectorMatch]:
+        if not self.documents:
+            return []
+        terms = [term for term in set(tokenize(query)) if term in self.document_frequency]
+        if not terms:
+            return []
+
+        count = len(self.documents)
+        average_length = self.total_length / count
+        idf = {
+            term: math.log(
+                1 + (count - self.document_frequency[term] + 0.5)
+                / (self.document_frequency[term] + 0.5)
+            )
+            for term in terms
+        }
+
+        scored = []
+        for doc_id, (term_frequency, length, metadata, _) in self.documents.items():
+            score = 0.0
+            for term in terms:
+                frequency = term_frequency.get(term)
+                if not frequency:
+                    continue
+                score += idf[term] * (
+                    frequency
+                    * (self.k1 + 1)
+                    / (
+                        frequency
+                        + self.k1 * (1 - self.b + self.b * length / average_length)
+                    )
+                )
+            if score > 0:
+                scored.append((score, doc_id, metadata))
+
+        scored.sort(key=lambda item: item[0], reverse=True)
+        best = scored[0][0] if scored else 1.0
+        # Scores are normalized to 0..1 so they read like similarity scores
+        return [
+            VectorMatch(id=doc_id, score=score / best, metadata=metadata)
+            for score, doc_id, metadata in scored[:top_k]
+        ]
+
+
+class LexicalIndex:
+    """Per-patient BM25 indexes, bounded to the most recently used patients
+    and to the newest ``max_documents_per_patient`` records of each"""
+
+    def __init__(self, max_patients: int = 10000, max_documents_per_patient: int = 500):
+        self.max_patients = max_patients
+        self.max_documents_per_patient = max_documents_per_patient
+        self._indexes: "OrderedDict[str, BM25Index]" = OrderedDict()
+        self._hydrated: Set[str] = set()
+        self._lock = threading.Lock()
+
+    def _index_for(self, phone_number: str, create: bool = False) -> Optional[BM25Index]:
+        index = self._indexes.get(phone_number)
+        if index is None and create:
+            index = self._indexes[phone_number] = BM25Index(
+                max_documents=self.max_documents_per_patient
+            )
+            while len(self._indexes) > self.max_patients:
+                evicted, _ = self._indexes.popitem(last=False)
+                self._hydrated.discard(evicted)
+        if index is not None:
+            self._indexes.move_to_end(phone_number)
+        return index
+
+    def is_hydrated(self, phone_number: str) -> bool:
+        return phone_number in self._hydrated
+
+    def mark_hydrated(self, phone_number: str):
+        """Record that the patient's history is loaded, even if it was empty"""
+        with self._lock:
+            # An empty index keeps patients without records from re-hydrating
+            self._index_for(phone_number, create=True)
+            self._hydrated.add(phone_number)
+
+    def add_record(
+        self,
+        phone_number: str,
+        record_id: str,
+        content: str,
+        entities: Iterable[str],
+        metadata: Dict,
+    ):
+        with self._lock:
+            self._index_for(phone_number, create=True).add(
+                record_id, content, entities, metadata
+            )
+
+    def search(
+        self, phone_number: str, query: str, top_k: int = 3
+    ) -> Tuple[List[VectorMatch], Set[str]]:
+        """Return BM25 matches and the patient's known entities found verbatim in query"""
+        with self._lock:
+            index = self._index_for(phone_number)
+            if index is None:
+                return [], set()
+            return index.search(query, top_k), index.exact_entities(query)
+
+    def drop(self, phone_number: str):
+        with self._lock:
+            self._indexes.pop(phone_number, None)
+            self._hydrated.discard(phone_number)
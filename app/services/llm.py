@@ -0,0 +1,202 @@
+# app/services/llm.py
+import asyncio
+import logging
+import time
+from functools import lru_cache
+from typing import Dict, List, Optional
+
+import httpx
+from groq import AsyncGroq
+
+from app.core.config import get_settings
+from app.services.resilience import (
+    CircuitBreaker,
+    CircuitOpenError,
+    LatencyTracker,
+    hedged,
+)
+
+settings = get_settings()
+
+
+class LLMGateway:
+    """Single async entry point for every Groq chat completion.
+
+    One ``AsyncGroq`` client (and therefore one connection pool) is shared by
+    all call sites, and a semaphore caps how many completions are in flight.
+
+    Every call runs under a deadline. An attempt still running after the
+    model's rolling p95 latency is hedged with a duplicate request, a model
+    whose circuit breaker is open is skipped, and failed or timed-out
+    attempts fall back along ``LLM_FALLBACK_MODELS`` to faster models.
+    """
+
+    def __init__(
+        self,
+        api_key: Optional[str] = None,
+        max_concurrency: int = None,
+        timeout: float = None,
+        max_connections: int = None,
+        max_retries: int = None,
+    ):
+        max_concurrency = max_concurrency or settings.LLM_MAX_CONCURRENCY
+        max_connections = max_connections or settings.LLM_MAX_CONNECTIONS
+        timeout = timeout or settings.LLM_TIMEOUT_SECONDS
+
+        self.semaphore = asyncio.Semaphore(max_concurrency)
+        self.http_client = httpx.AsyncClient(
+            limits=httpx.Limits(
+                max_connections=max_connections,
+                max_keepalive_connections=max_connections,
+            ),
+            timeout=timeout,
+        )
+        self.client = AsyncGroq(
+            api_key=api_key or settings.GROQ_API_KEY,
+            timeout=timeout,
+            max_retries=settings.LLM_MAX_RETRIES if max_retries is None else max_retries,
+            http_client=self.http_client,
+        )
+
+        self.deadline = settings.LLM_DEADLINE_SECONDS
+        self.attempt_timeout = settings.LLM_ATTEMPT_TIMEOUT_SECONDS
+        self.fallback_models: Dict[str, str] = dict(settings.LLM_FALLBACK_MODELS)
+        self.vision_models = set(settings.LLM_VISION_MODELS)
+        self._latency: Dict[str, LatencyTracker] = {}
+        self._breakers: Dict[str, CircuitBreaker] = {}
+
+        self.calls = 0
+        self.hedges = 0
+        self.timeouts = 0
+        self.fallbacks = 0
+        self.failures = 0
+
+    def _tracker(self, model: str) -> LatencyTracker:
+        if model not in self._latency:
+            self._latency[model] = LatencyTracker(settings.LLM_LATENCY_WINDOW)
+        return self._latency[model]
+
+    def _breaker(self, model: str) -> CircuitBreaker:
+        if model not in self._breakers:
+            self._breakers[model] = CircuitBreaker(
+                failure_threshold=settings.LLM_BREAKER_FAILURE_THRESHOLD,
+                recovery_seconds=settings.LLM_BREAKER_RECOVERY_SECONDS,
+            )
+        return self._breakers[model]
+
+    def _candidates(self, model: str, messages: List[dict]) -> List[str]:
+        """The requested model followed by its fallback chain"""
+        has_image = any(isinstance(message.get("content"), list) for message in messages)
+        candidates = [model]
+        while candidates[-1] in self.fallback_models:
+            fallback = self.fallback_models[candidates[-1]]
+            if fallback in candidates:
+                break
+            candidates.append(fallback)
+        if has_image:
+            # Image prompts can only fall back to models that accept images
+            candidates = [model] + [m for m in candidates[1:] if m in self.vision_models]
+        return candidates
+
+    def _hedge_delay(self, model: str) -> Optional[float]:
+        tracker = self._tracker(model)
+        if not settings.LLM_HEDGE_ENABLED or len(tracker) < settings.LLM_HEDGE_MIN_SAMPLES:
+            return None
+        return tracker.percentile(settings.LLM_HEDGE_PERCENTILE)
+
+    async def _call(self, model: str, messages: List[dict], **kwargs):
+        async with self.semaphore:
+            started = time.monotonic()
+            completion = await self.client.chat.completions.create(
+                model=model, messages=messages, **kwargs
+            )
+            self._tracker(model).record(time.monotonic() - started)
+            return completion
+
+    def _count_hedge(self):
+        self.hedges += 1
+
+    async def chat(
+        self,
+        model: str,
+        messages: List[dict],
+        deadline: Optional[float] = None,
+        **kwargs,
+    ):
+        """Create a chat completion within ``deadline`` seconds, hedging and falling back"""
+        self.calls += 1
+        expires_at = time.monotonic() + (deadline or self.deadline)
+        last_error: Exception = CircuitOpenError(f"Circuit open for {model}")
+
+        for attempt, candidate in enumerate(self._candidates(model, messages)):
+            remaining = expires_at - time.monotonic()
+            if remaining <= 0:
+                break
+            breaker = self._breaker(candidate)
+            if not breaker.allow():
+                last_error = CircuitOpenError(f"Circuit open for {candidate}")
+                continue
+            if attempt:
+                self.fallbacks += 1
+                logging.warning(f"Falling back from {model} to {candidate}: {last_error}")
+            try:
+                completion = await asyncio.wait_for(
+                    hedged(
+                        lambda: self._call(candidate, messages, **kwargs),
+                        self._hedge_delay(candidate),
+                        can_hedge=lambda: not self.semaphore.locked(),
+                        on_hedge=self._count_hedge,
+                    ),
+                    timeout=min(self.attempt_timeout, remaining),
+                )
+            except asyncio.TimeoutError:
+                self.timeouts += 1
+                breaker.record_failure()
+                last_error = TimeoutError(f"{candidate} timed out")
+                continue
+            except Exception as e:
+                breaker.record_failure()
+                last_error = e
+                continue
+            finally:
+                # A cancelled half-open probe must not block the model forever
+                breaker.release_probe()
+            breaker.record_success()
+            return completion
+
+        self.failures += 1
+        raise last_error
+
+    async def complete(self, model: str, messages: List[dict], **kwargs) -> str:
+        """Create a chat completion and return the first choice's text"""
+        completion = await self.chat(model, messages, **kwargs)
+        return completion.choices[0].message.content
+
+    def stats(self) -> Dict:
+        return {
+            "calls": self.calls,
+            "hedges": self.hedges,
+            "timeouts": self.timeouts,
+            "fallbacks": self.fallbacks,
+            "failures": self.failures,
+            "models": {
+                model: {
+                    "p50_seconds": self._tracker(model).percentile(50),
+                    "p95_seconds": self._tracker(model).percentile(95),
+                    "circuit": self._breaker(model).stats(),
+                }
+                for model in sorted(set(self._latency) | set(self._breakers))
+            },
+        }
+
+    async def aclose(self):
+        try:
+            await self.client.close()
+        except Exception as e:
+            logging.error(f"Error closing LLM client: {e}")
+
+
+@lru_cache()
+def get_llm_gateway() -> LLMGateway:
+    """Return the process-wide LLM gateway"""
+    return LLMGateway()
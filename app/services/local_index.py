@@ -0,0 +1,470 @@
+# app/services/local_index.py
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import threading
+import uuid
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Set, Tuple
+
+import numpy as np
+
+from app.services.patients import record_id_prefix
+from app.services.vector_writer import VectorMatch
+
+SHARED_PARTITION = "__shared__"
+
+
+@dataclass
+class QueryResponse:
+    """Mirrors the ``matches`` attribute of a Pinecone query response"""
+
+    matches: List[VectorMatch] = field(default_factory=list)
+
+
+@dataclass
+class FetchResponse:
+    """Mirrors the ``vectors`` attribute of a Pinecone fetch response"""
+
+    vectors: Dict[str, VectorMatch] = field(default_factory=dict)
+
+
+def matches_filter(metadata: Dict, metadata_filter: Optional[Dict]) -> bool:
+    """Evaluate a Pinecone-style metadata filter against one record"""
+    if not metadata_filter:
+        return True
+
+    for key, condition in metadata_filter.items():
+        if key == "$and":
+            if not all(matches_filter(metadata, sub) for sub in condition):
+                return False
+            continue
+        if key == "$or":
+            if not any(matches_filter(metadata, sub) for sub in condition):
+                return False
+            continue
+
+        value = metadata.get(key)
+        if not isinstance(condition, dict):
+            condition = {"$eq": condition}
+        for operator, expected in condition.items():
+            if operator == "$eq" and value != expected:
+                return False
+            if operator == "$ne" and value == expected:
+                return False
+            if operator == "$in" and value not in expected:
+                return False
+            if operator == "$nin" and value in expected:
+                return False
+            if operator in ("$gt", "$gte", "$lt", "$lte"):
+                if value is None:
+                    return False
+                if operator == "$gt" and not value > expected:
+                    return False
+                if operator == "$gte" and not value >= expected:
+                    return False
+                if operator == "$lt" and not value < expected:
+                    return False
+                if operator == "$lte" and not value <= expected:
+                    return False
+    return True
+
+
+def _phone_from_filter(metadata_filter: Optional[Dict]) -> Optional[str]:
+    if not metadata_filter or "phone_number" not in metadata_filter:
+        return None
+    condition = metadata_filter["phone_number"]
+    if isinstance(condition, dict):
+        return condition.get("$eq")
+    return condition
+
+
+class _Partition:
+    """One patient's vectors as a growable float32 matrix plus metadata"""
+
+    def __init__(self, dimension: int, capacity: int = 16):
+        self.dimension = dimension
+        self.matrix = np.zeros((capacity, dimension), dtype=np.float32)
+        self.norms = np.zeros(capacity, dtype=np.float32)
+        self.ids: List[str] = []
+        self.metadata: List[Dict] = []
+        self.positions: Dict[str, int] = {}
+        self.dirty = False
+
+    def __len__(self):
+        return len(self.ids)
+
+    def _ensure_writable(self, size: int):
+        capacity = self.matrix.shape[0]
+        if size > capacity or not self.matrix.flags.writeable:
+            new_capacity = max(size, capacity * 2 if size > capacity else capacity)
+            matrix = np.zeros((new_capacity, self.dimension), dtype=np.float32)
+            norms = np.zeros(new_capacity, dtype=np.float32)
+            matrix[: len(self)] = self.matrix[: len(self)]
+            norms[: len(self)] = self.norms[: len(self)]
+            self.matrix, self.norms = matrix, norms
+
+    def upsert(self, vector_id: str, values, metadata: Dict):
+        row = np.asarray(values, dtype=np.float32)
+        position = self.positions.get(vector_id)
+        if position is None:
+            position = len(self)
+            self._ensure_writable(position + 1)
+            self.ids.append(vector_id)
+            self.metadata.append(metadata)
+            self.positions[vector_id] = position
+        else:
+            self._ensure_writable(len(self))
+            self.metadata[position] = metadata
+        self.matrix[position] = row
+        self.norms[position] = np.linalg.norm(row)
+        self.dirty = True
+
+    def delete(self, vector_ids: List[str]):
+        doomed = set(vector_ids)
+        keep = [i for i, vid in enumerate(self.ids) if vid not in doomed]
+        self.matrix = np.array(self.matrix[keep], dtype=np.float32)
+        self.norms = np.array(self.norms[keep], dtype=np.float32)
+        self.ids = [self.ids[i] for i in keep]
+        self.metadata = [self.metadata[i] for i in keep]
+        self.positions = {vid: i for i, vid in enumerate(self.ids)}
+        self.dirty = True
+
+    def scores(self, query: np.ndarray, query_norm: float) -> np.ndarray:
+        count = len(self)
+        denominator = self.norms[:count] * query_norm
+        denominator[denominator == 0] = 1.0
+        return (self.matrix[:count] @ query) / denominator
+
+
+class LocalVectorIndex:
+    """In-process drop-in for the subset of the Pinecone ``Index`` API we use.
+
+    Vectors are partitioned per patient (``phone_number`` metadata) into
+    float32 NumPy matrices, queried with vectorized cosine top-k, and persisted
+    as ``.npy`` files that are memory-mapped back on load.
+    """
+
+    def __init__(self, path: Optional[str] = None, dimension: int = 512):
+        self.dimension = dimension
+        self.path = Path(path) if path else None
+        self._namespaces: Dict[str, Dict[str, _Partition]] = {}
+        self._lock = threading.RLock()
+        if self.path is not None:
+            self.load()
+
+    def _partitions(self, namespace: str) -> Dict[str, _Partition]:
+        return self._namespaces.setdefault(namespace or "", {})
+
+    def partition_size(self, phone_number: str, namespace: str = "") -> int:
+        with self._lock:
+            partition = self._partitions(namespace).get(phone_number)
+            return len(partition) if partition is not None else 0
+
+    def upsert(self, vectors: List[Dict], namespace: str = "", **kwargs):
+        with self._lock:
+            partitions = self._partitions(namespace)
+            for vector in vectors:
+                metadata = dict(vector.get("metadata") or {})
+                key = metadata.get("phone_number") or SHARED_PARTITION
+                partition = partitions.get(key)
+                if partition is None:
+                    partition = partitions[key] = _Partition(self.dimension)
+                partition.upsert(vector["id"], vector["values"], metadata)
+        return {"upserted_count": len(vectors)}
+
+    def delete(
+        self,
+        ids: Optional[List[str]] = None,
+        delete_all: bool = False,
+        namespace: str = "",
+        filter: Optional[Dict] = None,
+        **kwargs,
+    ):
+        with self._lock:
+            partitions = self._partitions(namespace)
+            if delete_all:
+                for partition in partitions.values():
+                    partition.delete(list(partition.ids))
+                return {}
+            for partition in partitions.values():
+                doomed = [
+                    vid
+                    for vid, metadata in zip(partition.ids, partition.metadata)
+                    if (ids is not None and vid in ids)
+                    or (filter is not None and matches_filter(metadata, filter))
+                ]
+                if doomed:
+                    partition.delete(doomed)
+        return {}
+
+    def list(
+        self, prefix: str = "", limit: int = 100, namespace: str = "", **kwargs
+    ) -> Iterator[List[str]]:
+        """Yield pages of ids starting with prefix, in sorted order"""
+        with self._lock:
+            ids = sorted(
+                vid
+                for partition in self._partitions(namespace).values()
+                for vid in partition.ids
+                if vid.startswith(prefix)
+            )
+        for start in range(0, len(ids), limit):
+            yield ids[start : start + limit]
+
+    def fetch(self, ids: List[str], namespace: str = "", **kwargs) -> FetchResponse:
+        wanted = set(ids)
+        vectors = {}
+        with self._lock:
+            for partition in self._partitions(namespace).values():
+                for vid in wanted.intersection(partition.positions):
+                    position = partition.positions[vid]
+                    vectors[vid] = VectorMatch(
+                        id=vid,
+                        score=0.0,
+                        metadata=partition.metadata[position],
+                        values=partition.matrix[position].tolist(),
+                    )
+        return FetchResponse(vectors=vectors)
+
+    def query(
+        self,
+        vector: List[float],
+        top_k: int = 10,
+        include_values: bool = False,
+        include_metadata: bool = False,
+        filter: Optional[Dict] = None,
+        namespace: str = "",
+        **kwargs,
+    ) -> QueryResponse:
+        query = np.asarray(vector, dtype=np.float32)
+        query_norm = float(np.linalg.norm(query)) or 1.0
+
+        with self._lock:
+            partitions = self._partitions(namespace)
+            phone_number = _phone_from_filter(filter)
+            if phone_number is not None:
+                candidates = [partitions[phone_number]] if phone_number in partitions else []
+            else:
+                candidates = list(partitions.values())
+
+            matches = []
+            for partition in candidates:
+                if not len(partition):
+                    continue
+                scores = partition.scores(query, query_norm)
+                if filter:
+                    mask = np.fromiter(
+                        (matches_filter(m, filter) for m in partition.metadata),
+                        dtype=bool,
+                        count=len(partition),
+                    )
+                    scores = np.where(mask, scores, -np.inf)
+                k = min(top_k, len(partition))
+                top = np.argpartition(-scores, k - 1)[:k]
+                for i in top:
+                    if scores[i] == -np.inf:
+                        continue
+                    matches.append(
+                        VectorMatch(
+                            id=partition.ids[i],
+                            score=float(scores[i]),
+                            metadata=partition.metadata[i] if include_metadata else {},
+                            values=partition.matrix[i].tolist() if include_values else [],
+                        )
+                    )
+
+        matches.sort(key=lambda match: match.score, reverse=True)
+        return QueryResponse(matches=matches[:top_k])
+
+    @staticmethod
+    def _file_stem(partition_key: str) -> str:
+        # Hash keeps phone numbers out of file names
+        return hashlib.sha256(partition_key.encode()).hexdigest()[:32]
+
+    def persist(self):
+        """Write partitions changed since the last persist to disk.
+
+        Dirty partitions are snapshotted under the lock and written outside
+        it. Each matrix goes to a new generation file and the JSON sidecar
+        that names it is swapped in with ``os.replace``, so a crash mid-write
+        leaves the previous partition intact.
+        """
+        if self.path is None:
+            return
+        snapshots = []
+        with self._lock:
+            for namespace, partitions in self._namespaces.items():
+                for key, partition in partitions.items():
+                    if not partition.dirty:
+                        continue
+                    snapshots.append(
+                        (
+                            namespace,
+                            key,
+                            np.array(partition.matrix[: len(partition)]),
+                            list(partition.ids),
+                            list(partition.metadata),
+                        )
+                    )
+                    partition.dirty = False
+
+        for namespace, key, matrix, ids, metadata in snapshots:
+            try:
+                self._write_partition(namespace, key, matrix, ids, metadata)
+            except Exception as e:
+                logging.error(f"Error persisting index partition: {e}")
+                with self._lock:
+                    partition = self._partitions(namespace).get(key)
+                    if partition is not None:
+                        partition.dirty = True
+
+    def _write_partition(self, namespace: str, key: str, matrix, ids, metadata):
+        directory = self.path / (namespace or "_default")
+        directory.mkdir(parents=True, exist_ok=True)
+        stem = self._file_stem(key)
+        meta_file = directory / f"{stem}.json"
+        previous = None
+        if meta_file.exists():
+            try:
+                previous = json.loads(meta_file.read_text()).get("matrix")
+            except ValueError:
+                previous = None
+
+        matrix_name = f"{stem}.{uuid.uuid4().hex[:12]}.npy"
+        with open(directory / matrix_name, "wb") as handle:
+            np.save(handle, matrix)
+            handle.flush()
+            os.fsync(handle.fileno())
+
+        temp_meta = directory / f"{stem}.json.tmp"
+        with open(temp_meta, "w") as handle:
+            json.dump({"key": key, "matrix": matrix_name, "ids": ids, "metadata": metadata}, handle)
+            handle.flush()
+            os.fsync(handle.fileno())
+        os.replace(temp_meta, meta_file)
+
+        # Older files stay readable through existing memory maps until closed
+        stale = previous or f"{stem}.npy"
+        if stale != matrix_name:
+            try:
+                (directory / stale).unlink()
+            except FileNotFoundError:
+                pass
+
+    def load(self):
+        """Memory-map every persisted partition; rows are copied on first write"""
+        if self.path is None or not self.path.exists():
+            return
+        with self._lock:
+            for directory in self.path.iterdir():
+                if not directory.is_dir():
+                    continue
+                namespace = "" if directory.name == "_default" else directory.name
+                partitions = self._partitions(namespace)
+                for meta_file in directory.glob("*.json"):
+                    try:
+                        meta = json.loads(meta_file.read_text())
+                        matrix_file = directory / meta.get(
+                            "matrix", meta_file.with_suffix(".npy").name
+                        )
+                        matrix = np.load(matrix_file, mmap_mode="r")
+                    except Exception as e:
+                        logging.error(f"Skipping unreadable index partition {meta_file}: {e}")
+                        continue
+                    partition = _Partition(self.dimension, capacity=0)
+                    partition.matrix = matrix
+                    partition.norms = np.linalg.norm(matrix, axis=1).astype(np.float32)
+                    partition.ids = list(meta["ids"])
+                    partition.metadata = list(meta["metadata"])
+                    partition.positions = {vid: i for i, vid in enumerate(partition.ids)}
+                    partitions[meta["key"]] = partition
+
+
+class TieredVectorIndex:
+    """Local per-patient hot tier in front of a remote (Pinecone) index.
+
+    Writes go to both tiers. The first query for a patient (or per-patient
+    namespace) loads their records from the remote index into the local tier;
+    from then on their queries are served locally, with writes keeping both
+    tiers in step. Queries that can't be scoped to one patient, and any query
+    whose partition failed to load, go to the remote index.
+    """
+
+    def __init__(self, local: LocalVectorIndex, remote, page_size: int = 100):
+        self.local = local
+        self.remote = remote
+        self.page_size = page_size
+        self._hydrated: Set[Tuple[str, str]] = set()
+
+    def upsert(self, vectors: List[Dict], namespace: str = "", **kwargs):
+        self.local.upsert(vectors=vectors, namespace=namespace)
+        if namespace:
+            kwargs["namespace"] = namespace
+        return self.remote.upsert(vectors=vectors, **kwargs)
+
+    def delete(self, namespace: str = "", **kwargs):
+        self.local.delete(namespace=namespace, **kwargs)
+        if namespace:
+            kwargs["namespace"] = namespace
+        return self.remote.delete(**kwargs)
+
+    def list(self, namespace: str = "", **kwargs):
+        if namespace:
+            kwargs["namespace"] = namespace
+        return self.remote.list(**kwargs)
+
+    def fetch(self, ids: List[str], namespace: str = "", **kwargs):
+        if namespace:
+            kwargs["namespace"] = namespace
+        return self.remote.fetch(ids=ids, **kwargs)
+
+    def query(self, vector, top_k: int = 10, filter=None, namespace: str = "", **kwargs):
+        phone_number = _phone_from_filter(filter)
+        # Per-patient namespace: the whole namespace is one patient
+        if phone_number is not None or namespace:
+            try:
+                self._hydrate(phone_number, namespace)
+            except Exception as e:
+                logging.error(f"Error loading {namespace or phone_number} into local index: {e}")
+            else:
+                return self.local.query(
+                    vector=vector, top_k=top_k, filter=filter, namespace=namespace, **kwargs
+                )
+        if namespace:
+            kwargs["namespace"] = namespace
+        return self.remote.query(vector=vector, top_k=top_k, filter=filter, **kwargs)
+
+    def _hydrate(self, phone_number: Optional[str], namespace: str):
+        """Copy a patient's remote records into the local tier, once per process"""
+        key = (namespace, phone_number or "")
+        if key in self._hydrated:
+            return
+        kwargs = {"namespace": namespace} if namespace else {}
+        prefix = record_id_prefix(phone_number) if phone_number is not None else ""
+        for page in self.remote.list(prefix=prefix, limit=self.page_size, **kwargs):
+            response = self.remote.fetch(ids=list(page), **kwargs)
+            vectors = [
+                {"id": vid, "values": list(vector.values), "metadata": vector.metadata or {}}
+                for vid, vector in response.vectors.items()
+            ]
+            if vectors:
+                # Upserts are by id, so records written meanwhile are harmless
+                self.local.upsert(vectors=vectors, namespace=namespace)
+        self._hydrated.add(key)
+
+    def persist(self):
+        self.local.persist()
+
+
+async def persist_periodically(index, interval_seconds: float):
+    """Persist a local index every ``interval_seconds`` until cancelled"""
+    while True:
+        await asyncio.sleep(interval_seconds)
+        try:
+            await asyncio.to_thread(index.persist)
+        except Exception as e:
+            logging.error(f"Periodic index persist failed: {e}")
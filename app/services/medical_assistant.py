@@ -1,11 +1,27 @@
 from app.services.report_generator import MedicalReportGenerator
 from datetime import datetime
-from typing import Optional, Dict
+from typing import Optional, Dict, Tuple
 from .whatsapp import WhatsAppService
+from .llm import LLMGateway
+from .background import background_tasks
+from .vector_writer import VectorWriter
+from .history_reader import HistoryReader
+from .patients import new_record_id, patient_key, patient_namespace
+from .embeddings import EmbeddingService
+from .profile_store import PatientProfileStore, normalize_entities
+from .lexical_index import LexicalIndex, reciprocal_rank_fusion
+from .fast_path import FastPathExtractor, MessageKind
+from .extraction import (
+    MEDICAL_CONTEXT_KEYS,
+    ExtractionBackend,
+    GroqExtractionBackend,
+    coerce_medical_context,
+)
 from langchain_openai import OpenAIEmbeddings, ChatOpenAI
 from langchain.prompts import ChatPromptTemplate
 from pinecone import Pinecone
-import uuid
+import asyncio
+import json
 import os
 import logging
 
@@ -25,17 +41,60 @@ Important Notes:
 
 Please provide a comprehensive response:"""
 
+COMBINED_PROMPT = """You're Matthew, a helpful AI medical assistant. Do two things with the patient's latest message:
+1. Extract and categorize medical information into these categories:
+    - conditions: Any mentioned medical conditions
+    - symptoms: Reported symptoms or discomfort
+    - medications: Any medications mentioned
+    - incidents: Medical events or incidents
+    - body_parts: Mentioned body parts or areas
+2. Write a personalized reply to the patient in second person, considering the conversation history. Only address the history if necessary - the reply must fit in 70 tokens.
+
+Respond only with a JSON object of the form {"medical_context": {<the five categories as lists>}, "reply": "<reply to the patient>"}."""
+
+# Record metadata read by _format_cases; all the lexical index keeps per record
+CASE_METADATA_FIELDS = ("phone_number", "content", "condition", "medications", "body_parts")
+
 
 class MedicalAssistantService:
-    def __init__(self, pinecone_index, embedding_client, groq_client):
+    def __init__(
+        self,
+        pinecone_index,
+        embedding_client,
+        llm: LLMGateway,
+        vector_writer: Optional[VectorWriter] = None,
+        profile_store: Optional[PatientProfileStore] = None,
+        use_namespaces: bool = False,
+        lexical_index: Optional[LexicalIndex] = None,
+        extraction_backend: Optional[ExtractionBackend] = None,
+        fast_path: Optional[FastPathExtractor] = None,
+        include_legacy_history: bool = False,
+    ):
         self.whatsapp = WhatsAppService()
         self.index = pinecone_index
+        self.vector_writer = vector_writer
+        self.profile_store = profile_store
+        self.use_namespaces = use_namespaces
+        self.lexical_index = lexical_index
+        self._hydrating = set()
+        self.history_reader = HistoryReader(
+            pinecone_index, include_legacy=include_legacy_history
+        )
         self.embedding_client = embedding_client
-        self.groq_client = groq_client
+        self.llm = llm
+        self.extraction = extraction_backend or GroqExtractionBackend(llm)
+        self.fast_path = fast_path
         self.prompt_template = ChatPromptTemplate.from_template(MEDICAL_PROMPT)
 
-    def extract_medical_context(
-        self, text: str, image_url: Optional[str] = None
+    def classify_message(self, text: str, image_url: Optional[str] = None):
+        """Lexicon fast path result, or None when the LLM must decide"""
+        if self.fast_path is None or image_url:
+            return None
+        result = self.fast_path.classify(text)
+        return None if result.kind == MessageKind.NEEDS_LLM else result
+
+    async def extract_medical_context(
+        self, text: str, image_url: Optional[str] = None, fast_result=None
     ) -> dict:
         """Extract structured medical context from user text."""
         extracted_medical_context = {
@@ -47,48 +106,230 @@ class MedicalAssistantService:
             "image_url": None,
         }
 
+        if fast_result is not None:
+            # Chit-chat or unambiguous lexicon entities; no LLM call needed
+            extracted_medical_context.update(fast_result.context)
+            return extracted_medical_context
+
         try:
-            context_extraction = self.groq_client.chat.completions.create(
-                model="llama-3.2-11b-vision-preview",
-                messages=[
-                    {
-                        "role": "system",
-                        "content": """You are a medical context analyzer. Extract and categorize medical information from the text into these categories:
-                            - conditions: Any mentioned medical conditions
-                            - symptoms: Reported symptoms or discomfort
-                            - medications: Any medications mentioned
-                            - incidents: Medical events or incidents
-                            - body_parts: Mentioned body parts or areas
-                            Respond only with a JSON object containing these categories.""",
-                    },
-                    {"role": "user", "content": text},
-                ],
-                temperature=0.3,
-                max_tokens=256,
-                top_p=0.9,
-                stream=False,
-                response_format={"type": "json_object"},
-            )
-            extracted_context = eval(context_extraction.choices[0].message.content)
+            extracted_medical_context.update(await self.extraction.extract(text))
             if image_url:
-                extracted_context["image_url"] = image_url
-
-            extracted_medical_context.update(extracted_context)
+                extracted_medical_context["image_url"] = image_url
         except Exception as e:
             logging.error(f"Error extracting medical context: {e}")
 
         return extracted_medical_context
 
+    async def extract_and_reply(self, text: str, chat_history=None) -> Tuple[dict, str]:
+        """Extract medical context and write the patient reply in one LLM call"""
+        extracted_medical_context = {
+            "conditions": [],
+            "symptoms": [],
+            "medications": [],
+            "incidents": [],
+            "body_parts": [],
+            "image_url": None,
+        }
+
+        completion = await self.llm.chat(
+            model="llama-3.2-11b-vision-preview",
+            messages=[
+                {"role": "system", "content": COMBINED_PROMPT},
+                {
+                    "role": "user",
+                    "content": f"Chat History: {chat_history}\n\nPatient Message: {text}",
+                },
+            ],
+            temperature=0.5,
+            max_tokens=350,
+            top_p=0.9,
+            stream=False,
+            response_format={"type": "json_object"},
+        )
+        result = json.loads(completion.choices[0].message.content)
+
+        reply = result.get("reply")
+        if not isinstance(reply, str) or not reply.strip():
+            raise ValueError("Combined extraction returned no reply")
+
+        extracted_medical_context.update(
+            coerce_medical_context(result.get("medical_context") or {})
+        )
+        return extracted_medical_context, reply.strip()
+
+    async def record_interaction(
+        self,
+        phone_number: str,
+        query: str,
+        medical_context: dict,
+        chat_history=None,
+        image_url: Optional[str] = None,
+        query_embedding=None,
+    ):
+        """Embed and store a message whose reply has already been sent"""
+        if not any(medical_context.get(key) for key in MEDICAL_CONTEXT_KEYS):
+            return
+
+        chat_context = self._format_chat_context(chat_history)
+        query_embedding = await self._embed_query(
+            phone_number, f"{query} {chat_context}", query_embedding
+        )
+        self._store_record(
+            phone_number, query, query_embedding, medical_context, image_url
+        )
+
+    async def _embed(self, phone_number: str, text: str):
+        """Embed text, tagging cached vectors with the patient so they can be purged"""
+        if isinstance(self.embedding_client, EmbeddingService):
+            return await self.embedding_client.aembed_query(
+                text, owner=patient_key(phone_number)
+            )
+        return await self.embedding_client.aembed_query(text)
+
+    async def _embed_query(self, phone_number: str, text: str, query_embedding=None):
+        """Embedding for a query, reusing one the caller already computed"""
+        if query_embedding is not None:
+            return query_embedding
+        return await self._embed(phone_number, text)
+
+    async def record_message(
+        self, phone_number: str, query: str, chat_history=None, query_embedding=None
+    ):
+        """Extract and store a message whose reply came from the response cache"""
+        medical_context = await self.extract_medical_context(
+            query, fast_result=self.classify_message(query)
+        )
+        await self.record_interaction(
+            phone_number=phone_number,
+            query=query,
+            medical_context=medical_context,
+            chat_history=chat_history,
+            query_embedding=query_embedding,
+        )
+
+    def _format_chat_context(self, chat_history) -> str:
+        chat_context = ""
+        if isinstance(chat_history, str):
+            # Already compacted by the HistoryCompactor
+            return f"\nPrevious conversation:\n{chat_history}\n" if chat_history else ""
+        if chat_history:
+            chat_context = "\nPrevious conversation:\n"
+            for msg in chat_history:
+                chat_context += f"{msg.type}: {msg.content}\n"
+        return chat_context
+
+    def _namespace(self, phone_number: str) -> str:
+        """Per-patient namespace when partitioning is on, else the default one"""
+        return patient_namespace(phone_number) if self.use_namespaces else ""
+
+    def _build_vector(
+        self,
+        phone_number: str,
+        query: str,
+        query_embedding,
+        medical_context: dict,
+        image_url: Optional[str] = None,
+        created_at: Optional[datetime] = None,
+    ) -> dict:
+        created_at = created_at or datetime.now()
+        return {
+            "id": new_record_id(phone_number, created_at),
+            "values": query_embedding,
+            "metadata": {
+                "content": query,
+                "medical_relevance": "general",
+                "condition": ", ".join(
+                    normalize_entities(medical_context.get("conditions"))
+                ),
+                "chronic": "",
+                "symptoms": normalize_entities(medical_context.get("symptoms")),
+                "medications": normalize_entities(medical_context.get("medications")),
+                "body_parts": normalize_entities(medical_context.get("body_parts")),
+                "phone_number": phone_number,
+                "image_url": image_url or False,
+                "date": created_at.isoformat(),
+            },
+        }
+
+    def _store_record(
+        self,
+        phone_number: str,
+        query: str,
+        query_embedding,
+        medical_context: dict,
+        image_url: Optional[str] = None,
+    ) -> dict:
+        """Persist a processed message to the vector index and patient profile"""
+        created_at = datetime.now()
+        vector_data = self._build_vector(
+            phone_number, query, query_embedding, medical_context, image_url, created_at
+        )
+
+        # Insert into Pinecone without holding up the reply
+        if self.vector_writer is not None:
+            # Batched write-behind; retries and flush-on-shutdown included
+            self.vector_writer.add(vector_data, namespace=self._namespace(phone_number))
+        else:
+            # Failures are logged and counted by the background tracker
+            background_tasks.spawn(
+                asyncio.to_thread(
+                    self.index.upsert,
+                    vectors=[vector_data],
+                    namespace=self._namespace(phone_number),
+                ),
+                name=f"pinecone-upsert-{vector_data['id']}",
+            )
+
+        self._index_lexical(phone_number, vector_data["id"], vector_data["metadata"])
+
+        if self.profile_store is not None:
+            background_tasks.spawn(
+                self.profile_store.record(
+                    phone_number,
+                    medical_context,
+                    content=query,
+                    record_id=vector_data["id"],
+                    created_at=created_at,
+                ),
+                name=f"profile-update-{vector_data['id']}",
+                owner=phone_number,
+            )
+        return vector_data
+
     async def process_and_respond(
         self,
         phone_number: str,
         query: str,
         chat_history=None,
         image_url: Optional[str] = None,
+        query_embedding=None,
     ):
         try:
-            # Extract medical context from the query
-            medical_context = self.extract_medical_context(query, image_url)
+            fast_result = self.classify_message(query, image_url)
+            if fast_result is not None and fast_result.kind == MessageKind.NO_MEDICAL:
+                return query
+
+            context_query = f"{query} {self._format_chat_context(chat_history)}"
+
+            # Lexical lookup is local and instant; an exact hit on one of the
+            # patient's known entities means vector search isn't needed
+            lexical_matches, exact_entities = self._lexical_search(phone_number, query)
+
+            # Extraction and embedding are independent, so run them concurrently
+            extraction = asyncio.create_task(
+                self.extract_medical_context(query, image_url, fast_result)
+            )
+            embedding = None
+            if not exact_entities:
+                embedding = asyncio.create_task(
+                    self._embed_query(phone_number, context_query, query_embedding)
+                )
+            try:
+                medical_context = await extraction
+            except BaseException:
+                if embedding is not None:
+                    embedding.cancel()
+                raise
 
             # Check if medical context is empty
             empty_context = {
@@ -100,52 +341,39 @@ class MedicalAssistantService:
                 "image_url": None,
             }
             if medical_context == empty_context:
+                if embedding is not None:
+                    embedding.cancel()
                 return query
 
-            chat_context = ""
-            if chat_history:
-                chat_context = "\nPrevious conversation:\n"
-                for msg in chat_history:
-                    chat_context += f"{msg.type}: {msg.content}\n"
-
-            # Create embedding with context
-            context_query = f"{query} {chat_context}"
-            query_embedding = self.embedding_client.embed_query(context_query)
-
             medical_context["phone_number"] = phone_number
-            vector_data = {
-                "id": str(uuid.uuid4()),
-                "values": query_embedding,
-                "metadata": {
-                    "content": query,
-                    "medical_relevance": "general",
-                    "condition": "",
-                    "chronic": "",
-                    "medications": [],
-                    "body_parts": [],
-                    "phone_number": phone_number,
-                    "image_url": image_url or False,
-                    "date": datetime.now().isoformat(),
-                },
-            }
-
-            # Insert into Pinecone
-            self.index.upsert(vectors=[vector_data])
-
-            # Search Pinecone for similar cases
-            results = self.index.query(
-                vector=query_embedding,
-                top_k=3,
-                include_values=True,
-                include_metadata=True,
-                filter={
-                    "phone_number": {
-                        "$eq": phone_number
-                    }  # Filter by user's phone number
-                },
-            )
 
-            cases_text = self._format_cases(results.matches)
+            if embedding is None:
+                # Served from the lexical index; embed and store off the request path
+                matches = lexical_matches
+                background_tasks.spawn(
+                    self._embed_and_store(
+                        phone_number,
+                        query,
+                        context_query,
+                        medical_context,
+                        image_url,
+                        query_embedding,
+                    ),
+                    name=f"embed-and-store-{phone_number}",
+                    owner=phone_number,
+                )
+            else:
+                query_embedding = await embedding
+                self._store_record(
+                    phone_number, query, query_embedding, medical_context, image_url
+                )
+                matches = await self._vector_search(phone_number, query_embedding)
+                if lexical_matches:
+                    matches = reciprocal_rank_fusion(
+                        [matches, lexical_matches], top_k=3
+                    )
+
+            cases_text = self._format_cases(matches)
 
             # Include medical context in the prompt
             prompt = self.prompt_template.format_messages(
@@ -166,6 +394,98 @@ class MedicalAssistantService:
             )
             return {"success": False, "error": str(e)}
 
+    def _lexical_search(self, phone_number: str, query: str):
+        if self.lexical_index is None:
+            return [], set()
+        if not self.lexical_index.is_hydrated(phone_number):
+            self._hydrate_lexical_index(phone_number)
+        return self.lexical_index.search(phone_number, query, top_k=3)
+
+    def _hydrate_lexical_index(self, phone_number: str):
+        """Load the patient's existing records into the lexical index in the background"""
+        if phone_number in self._hydrating:
+            return
+        self._hydrating.add(phone_number)
+
+        async def hydrate():
+            try:
+                async for metadata in self.history_reader.stream(
+                    phone_number, namespace=self._namespace(phone_number) or None
+                ):
+                    self._index_lexical(phone_number, metadata["id"], metadata)
+                self.lexical_index.mark_hydrated(phone_number)
+            finally:
+                self._hydrating.discard(phone_number)
+
+        background_tasks.spawn(
+            hydrate(), name=f"lexical-hydrate-{phone_number}", owner=phone_number
+        )
+
+    def _index_lexical(self, phone_number: str, record_id: str, metadata: dict):
+        if self.lexical_index is None:
+            return
+        entities = list(metadata.get("symptoms") or [])
+        entities += metadata.get("medications") or []
+        entities += metadata.get("body_parts") or []
+        if metadata.get("condition"):
+            entities += metadata["condition"].split(", ")
+        # Keep only what _format_cases reads; the rest stays in the vector index
+        case_metadata = {
+            field: metadata[field] for field in CASE_METADATA_FIELDS if field in metadata
+        }
+        self.lexical_index.add_record(
+            phone_number, record_id, metadata.get("content", ""), entities, case_metadata
+        )
+
+    async def _embed_and_store(
+        self,
+        phone_number: str,
+        query: str,
+        context_query: str,
+        medical_context: dict,
+        image_url: Optional[str] = None,
+        query_embedding=None,
+    ):
+        query_embedding = await self._embed_query(
+            phone_number, context_query, query_embedding
+        )
+        self._store_record(
+            phone_number, query, query_embedding, medical_context, image_url
+        )
+
+    async def _vector_search(self, phone_number: str, query_embedding) -> list:
+        """Similar-case lookup in the vector index, merged with unflushed writes"""
+        # Search Pinecone for similar cases
+        if self.use_namespaces:
+            # The patient's own namespace; no metadata filter needed
+            scope = {"namespace": self._namespace(phone_number)}
+        else:
+            scope = {
+                "filter": {
+                    "phone_number": {
+                        "$eq": phone_number
+                    }  # Filter by user's phone number
+                }
+            }
+        results = await asyncio.to_thread(
+            self.index.query,
+            vector=query_embedding,
+            top_k=3,
+            include_values=False,
+            include_metadata=True,
+            **scope,
+        )
+
+        matches = results.matches
+        if self.vector_writer is not None:
+            # Read-your-writes: include records Pinecone may not serve yet
+            matches = VectorWriter.merge_matches(
+                matches,
+                self.vector_writer.recent_matches(phone_number, query_embedding),
+                top_k=3,
+            )
+        return matches
+
     def _format_cases(self, matches):
         cases_text = ""
         for i, match in enumerate(matches, 1):
@@ -188,16 +508,19 @@ class MedicalAssistantService:
     async def collect_medical_history(self, phone_number: str) -> Dict:
         """Collect all medical history for a user"""
         try:
-            history_query = "Retrieve comprehensive medical history including conditions, symptoms, medications, and incidents"
-            query_embedding = self.embedding_client.embed_query(history_query)
-            # Get all records for user
-            results = self.index.query(
-                vector=[0.0] * 512,  # Dummy vector
-                top_k=100,
-                # filter={"phone_number": {"$eq": phone_number}},
-                include_metadata=True,
-            )
-            print("🟣 - results.matches", results.matches)
+            if self.profile_store is not None and await self.profile_store.is_hydrated(
+                phone_number
+            ):
+                # Incrementally maintained profile: O(profile), no index scan
+                profile = await self.profile_store.get_profile(phone_number)
+                return PatientProfileStore.to_medical_history(profile)
+
+            # Records that predate the profile are backfilled during the scan,
+            # so the next report can be served from the profile
+            known_ids = None
+            if self.profile_store is not None:
+                known_ids = await self.profile_store.event_ids(phone_number)
+
             medical_history = {
                 "conditions": [],
                 "symptoms": [],
@@ -206,23 +529,32 @@ class MedicalAssistantService:
                 "body_parts": [],
                 "chronological_events": [],
             }
-            for match in results.matches:
+            # Stream every record of this patient, oldest first
+            async for metadata in self.history_reader.stream(
+                phone_number, namespace=self._namespace(phone_number) or None
+            ):
                 event = {
-                    "date": match.metadata.get(
-                        "created_at", datetime.now().isoformat()
-                    ),
-                    "content": match.metadata.get("content", ""),
-                    "type": match.metadata.get("medical_relevance", "general"),
+                    "date": metadata.get("date")
+                    or metadata.get("created_at", datetime.now().isoformat()),
+                    "content": metadata.get("content", ""),
+                    "type": metadata.get("medical_relevance", "general"),
                 }
                 medical_history["chronological_events"].append(event)
 
-                if match.metadata.get("condition"):
-                    medical_history["conditions"].append(match.metadata["condition"])
-                if match.metadata.get("medications"):
-                    medical_history["medications"].extend(match.metadata["medications"])
-                if match.metadata.get("body_parts"):
-                    medical_history["body_parts"].extend(match.metadata["body_parts"])
+                if metadata.get("condition"):
+                    medical_history["conditions"].append(metadata["condition"])
+                if metadata.get("symptoms"):
+                    medical_history["symptoms"].extend(metadata["symptoms"])
+                if metadata.get("medications"):
+                    medical_history["medications"].extend(metadata["medications"])
+                if metadata.get("body_parts"):
+                    medical_history["body_parts"].extend(metadata["body_parts"])
+
+                if known_ids is not None and metadata.get("id") not in known_ids:
+                    await self.profile_store.record_metadata(phone_number, metadata)
 
+            if known_ids is not None:
+                await self.profile_store.mark_hydrated(phone_number)
             return medical_history
 
         except Exception as e:
@@ -0,0 +1,94 @@
+# app/services/medical_lexicon.py
+"""Bundled lexicon for the extraction fast path.
+
+Terms are lowercase and written as they appear after normalization (words
+separated by single spaces). Ambiguous everyday words ("cold", "sore",
+"hurts", "back", "fall", "heart") are left out on purpose so messages using
+them go to the LLM; multi-word terms like "back pain" keep them unambiguous.
+"""
+
+CONDITIONS = """
+diabetes|type 1 diabetes|type 2 diabetes|hypertension|high blood pressure|low blood pressure|
+asthma|migraine|migraines|arthritis|osteoarthritis|rheumatoid arthritis|flu|influenza|covid|
+covid 19|pneumonia|bronchitis|anemia|anaemia|depression|anxiety|eczema|psoriasis|acne|allergy|
+allergies|hay fever|infection|ear infection|sinus infection|uti|urinary tract infection|
+strep throat|sinusitis|gerd|acid reflux|ibs|cancer|heart disease|heart attack|stroke|epilepsy|
+hypothyroidism|hyperthyroidism|kidney stones|gout|insomnia|obesity|high cholesterol|copd|
+tonsillitis|conjunctivitis|pink eye|chickenpox|measles|malaria|typhoid|dengue|tuberculosis|
+hepatitis|hiv|ulcer|stomach ulcer|appendicitis|concussion|sprain|fracture|food poisoning|
+dehydration|gastritis|vertigo|sciatica|tendonitis|shingles|scabies|thrush|yeast infection
+"""
+
+SYMPTOMS = """
+headache|headaches|fever|high fever|cough|coughing|dry cough|sore throat|runny nose|
+stuffy nose|blocked nose|congestion|sneezing|nausea|vomiting|throwing up|diarrhea|diarrhoea|
+constipation|fatigue|tiredness|dizziness|dizzy|lightheaded|chest pain|back pain|lower back pain|
+stomach ache|stomachache|stomach pain|abdominal pain|neck pain|knee pain|joint pain|joint pains|
+muscle pain|muscle aches|body aches|toothache|earache|ear pain|cramps|period cramps|rash|itching|
+itchy|swelling|swollen|shortness of breath|short of breath|difficulty breathing|wheezing|chills|
+sweating|night sweats|bleeding|nosebleed|bruising|numbness|tingling|weakness|blurred vision|
+blurry vision|palpitations|loss of appetite|weight loss|heartburn|indigestion|bloating|
+stiffness|fainting|seizure|seizures|sore eyes|red eyes|watery eyes|hives|blisters|
+"""
+
+MEDICATIONS = """
+ibuprofen|paracetamol|acetaminophen|tylenol|advil|motrin|aspirin|naproxen|aleve|amoxicillin|
+azithromycin|penicillin|ciprofloxacin|doxycycline|metformin|insulin|lisinopril|amlodipine|
+atorvastatin|simvastatin|losartan|metoprolol|omeprazole|pantoprazole|ranitidine|famotidine|
+antacid|antacids|cetirizine|zyrtec|loratadine|claritin|benadryl|diphenhydramine|prednisone|
+albuterol|salbutamol|inhaler|levothyroxine|sertraline|fluoxetine|escitalopram|warfarin|
+clopidogrel|codeine|tramadol|morphine|antibiotic|antibiotics|antihistamine|antihistamines|
+vitamin d|vitamin c|iron supplements|melatonin|ors|oral rehydration salts|cough syrup|
+nasal spray|eye drops|hydrocortisone|birth control|the pill|
+"""
+
+BODY_PARTS = """
+neck|chest|lower back|upper back|stomach|abdomen|belly|arm|arms|leg|legs|knee|knees|
+ankle|ankles|foot|feet|hand|hands|wrist|wrists|elbow|elbows|shoulder|shoulders|hip|hips|eye|
+eyes|ear|ears|nose|throat|mouth|teeth|tooth|gums|tongue|skin|lungs|lung|kidney|kidneys|
+liver|joints|muscles|finger|fingers|toe|toes|spine|jaw|forehead|face|scalp|thigh|calf|groin
+"""
+
+INCIDENTS = """
+fell|fainted|passed out|accident|car accident|injury|injured|burned|burnt|bitten|
+dog bite|insect bite|bee sting|twisted ankle|hit my head|surgery|hospitalized|
+hospitalised|emergency room|er visit|overdose|allergic reaction
+"""
+
+
+def _terms(block: str):
+    return [term.strip() for term in block.split("|") if term.strip()]
+
+
+LEXICON = {
+    "conditions": _terms(CONDITIONS),
+    "symptoms": _terms(SYMPTOMS),
+    "medications": _terms(MEDICATIONS),
+    "body_parts": _terms(BODY_PARTS),
+    "incidents": _terms(INCIDENTS),
+}
+
+# Messages made only of these words carry no medical content
+CHITCHAT = frozenset(
+    """
+    hi hello hey hiya yo heya greetings thanks thank thx ty tysm ok okay k kk cool great
+    good nice fine yes yeah yep yup no nope nah sure bye goodbye morning evening night
+    afternoon see later cheers alright awesome perfect lol haha hahaha wow please welcome
+    appreciate much so very how are doing whats what up there matthew again too all well
+    got noted understood great right sounds amazing
+    """.split()
+)
+
+# Words that may surround obvious entities without changing their meaning
+FILLER = frozenset(
+    """
+    have has had having got getting feel feeling felt take taking took using use on some
+    also still again since today yesterday now bit little lot kind of and with from about
+    day days week weeks hour hours ve m s ll re d
+    """.split()
+)
+
+# Negated mentions ("no fever", "stopped taking ibuprofen") need the LLM
+NEGATIONS = frozenset(
+    "no not never don didn doesn isn wasn haven hasn without stopped quit nor none".split()
+)
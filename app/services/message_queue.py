@@ -0,0 +1,101 @@
+# app/services/message_queue.py
+import asyncio
+import logging
+from collections import deque
+from typing import Awaitable, Callable, Deque, Dict, Optional
+
+
+MessageHandler = Callable[[dict, str], Awaitable[None]]
+
+
+class QueueFullError(Exception):
+    """Raised when a message cannot be enqueued because the queue is full"""
+
+
+class MessageQueue:
+    """Bounded queue of webhook messages processed in the background.
+
+    Each phone number gets its own FIFO, drained by one task while it has
+    pending messages, so a patient's messages are processed in arrival order.
+    Handler calls across patients share a pool of ``max_concurrency`` slots,
+    taken per message, so one slow patient holds at most one slot and never
+    delays anyone else's queue. At most ``max_size`` messages are pending.
+    """
+
+    def __init__(
+        self, handler: MessageHandler, max_concurrency: int = 8, max_size: int = 1000
+    ):
+        self.handler = handler
+        self.max_concurrency = max(1, max_concurrency)
+        self.max_size = max_size
+        self._pending: Dict[str, Deque[dict]] = {}
+        self._drainers: Dict[str, asyncio.Task] = {}
+        self._size = 0
+        self._semaphore: Optional[asyncio.Semaphore] = None
+
+    @property
+    def running(self) -> bool:
+        return self._semaphore is not None
+
+    def start(self):
+        """Accept messages; drain tasks are spawned per phone on demand"""
+        if self.running:
+            return
+        self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        logging.info(
+            f"Message queue started with up to {self.max_concurrency} concurrent messages"
+        )
+
+    async def stop(self, timeout: Optional[float] = 10.0):
+        """Drain pending messages (up to timeout) and stop accepting new ones"""
+        if not self.running:
+            return
+        drainers = list(self._drainers.values())
+        if drainers:
+            _, unfinished = await asyncio.wait(drainers, timeout=timeout)
+            if unfinished:
+                logging.warning("Message queue did not drain before shutdown")
+                for drainer in unfinished:
+                    drainer.cancel()
+                await asyncio.gather(*unfinished, return_exceptions=True)
+        self._pending.clear()
+        self._drainers.clear()
+        self._size = 0
+        self._semaphore = None
+        logging.info("Message queue stopped")
+
+    def enqueue(self, message: dict, phone_number: str):
+        """Enqueue a message without waiting; raises QueueFullError on overflow"""
+        if not self.running:
+            raise RuntimeError("Message queue is not running")
+        if self._size >= self.max_size:
+            raise QueueFullError(f"Message queue full for {phone_number}")
+        self._pending.setdefault(phone_number, deque()).append(message)
+        self._size += 1
+        if phone_number not in self._drainers:
+            self._drainers[phone_number] = asyncio.create_task(
+                self._drain(phone_number), name=f"message-drain-{phone_number}"
+            )
+
+    def qsize(self) -> int:
+        return self._size
+
+    async def _drain(self, phone_number: str):
+        pending = self._pending[phone_number]
+        try:
+            while pending:
+                message = pending.popleft()
+                try:
+                    async with self._semaphore:
+                        await self.handler(message, phone_number)
+                except Exception as e:
+                    logging.error(
+                        f"Failed processing message from {phone_number}: {e}",
+                        exc_info=True,
+                    )
+                finally:
+                    self._size -= 1
+        finally:
+            # No await since the last emptiness check, so nothing was missed
+            self._pending.pop(phone_number, None)
+            self._drainers.pop(phone_number, None)
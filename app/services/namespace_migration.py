@@ -0,0 +1,162 @@
+# app/services/namespace_migration.py
+"""Backfill existing vectors into per-patient namespaces.
+
+Usage::
+
+    python -m app.services.namespace_migration [--dry-run] [--delete-source]
+    python -m app.services.namespace_migration --rewrite-ids [--dry-run]
+"""
+import argparse
+import logging
+from collections import defaultdict
+from datetime import datetime
+from typing import Dict, List
+
+from app.services.patients import RECORD_ID_SEPARATOR, new_record_id, patient_namespace
+
+
+def backfill_namespaces(
+    index,
+    source_namespace: str = "",
+    batch_size: int = 100,
+    delete_source: bool = False,
+    dry_run: bool = False,
+) -> Dict[str, int]:
+    """Copy every vector of source_namespace into its patient's namespace.
+
+    Vectors without ``phone_number`` metadata are left in place. Ids are
+    listed up front so deleting moved vectors cannot disturb pagination.
+    """
+    stats = {"listed": 0, "moved": 0, "skipped": 0, "deleted": 0}
+
+    ids: List[str] = []
+    for page in index.list(namespace=source_namespace, limit=batch_size):
+        ids.extend(page)
+    stats["listed"] = len(ids)
+    logging.info(f"Backfilling {len(ids)} vectors from namespace '{source_namespace}'")
+
+    for start in range(0, len(ids), batch_size):
+        page = ids[start : start + batch_size]
+        response = index.fetch(ids=page, namespace=source_namespace)
+
+        by_namespace: Dict[str, List[dict]] = defaultdict(list)
+        moved_ids = []
+        for vector_id, vector in response.vectors.items():
+            metadata = dict(vector.metadata or {})
+            phone_number = metadata.get("phone_number")
+            if not phone_number:
+                stats["skipped"] += 1
+                continue
+            by_namespace[patient_namespace(phone_number)].append(
+                {"id": vector_id, "values": list(vector.values), "metadata": metadata}
+            )
+            moved_ids.append(vector_id)
+
+        if not dry_run:
+            for namespace, vectors in by_namespace.items():
+                index.upsert(vectors=vectors, namespace=namespace)
+            if delete_source and moved_ids:
+                index.delete(ids=moved_ids, namespace=source_namespace)
+                stats["deleted"] += len(moved_ids)
+        stats["moved"] += len(moved_ids)
+
+    logging.info(f"Namespace backfill finished: {stats}")
+    return stats
+
+
+def rewrite_legacy_ids(
+    index,
+    namespace: str = "",
+    batch_size: int = 100,
+    dry_run: bool = False,
+) -> Dict[str, int]:
+    """Re-key records with legacy (uuid) ids to ``<patient key>#<epoch ms>#...`` ids.
+
+    Once done, ``HistoryReader`` finds every record by id prefix and never
+    needs the filtered legacy query. The new id's timestamp comes from the
+    record's ``date`` metadata; old ids are deleted after the copy.
+    """
+    stats = {"listed": 0, "rewritten": 0, "skipped": 0}
+
+    legacy_ids: List[str] = []
+    for page in index.list(namespace=namespace, limit=batch_size):
+        stats["listed"] += len(page)
+        legacy_ids.extend(vid for vid in page if RECORD_ID_SEPARATOR not in vid)
+    logging.info(f"Rewriting {len(legacy_ids)} legacy ids in namespace '{namespace}'")
+
+    for start in range(0, len(legacy_ids), batch_size):
+        page = legacy_ids[start : start + batch_size]
+        response = index.fetch(ids=page, namespace=namespace)
+
+        vectors = []
+        old_ids = []
+        for vector_id, vector in response.vectors.items():
+            metadata = dict(vector.metadata or {})
+            phone_number = metadata.get("phone_number")
+            if not phone_number:
+                stats["skipped"] += 1
+                continue
+            try:
+                created_at = datetime.fromisoformat(metadata.get("date", ""))
+            except ValueError:
+                created_at = datetime.fromtimestamp(0)
+            vectors.append(
+                {
+                    "id": new_record_id(phone_number, created_at),
+                    "values": list(vector.values),
+                    "metadata": metadata,
+                }
+            )
+            old_ids.append(vector_id)
+
+        if not dry_run and vectors:
+            index.upsert(vectors=vectors, namespace=namespace)
+            index.delete(ids=old_ids, namespace=namespace)
+        stats["rewritten"] += len(vectors)
+
+    logging.info(f"Legacy id rewrite finished: {stats}")
+    return stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--source-namespace", default="")
+    parser.add_argument("--batch-size", type=int, default=100)
+    parser.add_argument("--delete-source", action="store_true")
+    parser.add_argument("--dry-run", action="store_true")
+    parser.add_argument(
+        "--rewrite-ids",
+        action="store_true",
+        help="Re-key legacy uuid ids to prefixed ids instead of moving namespaces",
+    )
+    args = parser.parse_args()
+
+    from pinecone import Pinecone
+    from app.core.config import get_settings
+
+    logging.basicConfig(level=logging.INFO)
+    settings = get_settings()
+    index = Pinecone(api_key=settings.PINECONE_API_KEY).Index("medical-records")
+    if args.rewrite_ids:
+        print(
+            rewrite_legacy_ids(
+                index,
+                namespace=args.source_namespace,
+                batch_size=args.batch_size,
+                dry_run=args.dry_run,
+            )
+        )
+        return
+    print(
+        backfill_namespaces(
+            index,
+            source_namespace=args.source_namespace,
+            batch_size=args.batch_size,
+            delete_source=args.delete_source,
+            dry_run=args.dry_run,
+        )
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,128 @@
+# app/services/patient_purge.py
+import asyncio
+import logging
+from typing import Dict, List
+
+from app.services.background import background_tasks
+from app.services.chat_history import ChatHistoryStore
+from app.services.history_compactor import HistoryCompactor
+from app.services.history_reader import HistoryReader
+from app.services.patients import patient_key, patient_namespace
+from app.services.profile_store import PatientProfileStore
+
+# Pinecone accepts at most 1000 ids per delete call
+DELETE_BATCH_SIZE = 1000
+
+
+class PatientDataPurger:
+    """Removes one patient's data without touching anyone else's.
+
+    ``purge`` first waits for the patient's in-flight background writes
+    (profile updates, summary refreshes, record storage) so they cannot
+    recreate keys afterwards. It then UNLINKs the patient's known Redis keys
+    (chat history, summary, profile, cached embeddings) in one call, so Redis
+    frees memory in the background, and drops the patient from in-process
+    caches. ``purge_external`` deletes the patient's vector records and
+    stored images and is meant to run as a background job.
+    """
+
+    def __init__(
+        self,
+        redis_client,
+        chat_store: ChatHistoryStore,
+        embedding_service=None,
+        lexical_index=None,
+        response_cache=None,
+        vector_writer=None,
+        index=None,
+        storage=None,
+        use_namespaces: bool = False,
+        wait_timeout: float = 10.0,
+        image_prefix: str = "health_images/",
+    ):
+        self.redis = redis_client
+        self.chat_store = chat_store
+        self.embedding_service = embedding_service
+        self.lexical_index = lexical_index
+        self.response_cache = response_cache
+        self.vector_writer = vector_writer
+        self.index = index
+        self.storage = storage
+        self.use_namespaces = use_namespaces
+        self.wait_timeout = wait_timeout
+        self.image_prefix = image_prefix
+        self.history_reader = HistoryReader(index) if index is not None else None
+
+    def redis_keys(self, phone_number: str) -> List[str]:
+        """The patient's chat, summary and profile keys"""
+        return [
+            self.chat_store.key(phone_number),
+            HistoryCompactor.summary_key(phone_number),
+            *PatientProfileStore.keys(phone_number),
+        ]
+
+    async def purge(self, phone_number: str) -> Dict[str, int]:
+        """Remove the patient's Redis keys and in-process state"""
+        settled = await background_tasks.wait_for_owner(
+            phone_number, patient_key(phone_number), timeout=self.wait_timeout
+        )
+        if not settled:
+            logging.warning(f"Purging {phone_number} with background writes still running")
+        stats = {"redis_keys": await self.redis.unlink(*self.redis_keys(phone_number))}
+        if self.embedding_service is not None:
+            stats["embeddings"] = await self.embedding_service.purge_owner(
+                patient_key(phone_number)
+            )
+        if self.vector_writer is not None:
+            stats["buffered_vectors"] = self.vector_writer.discard(phone_number)
+        if self.lexical_index is not None:
+            self.lexical_index.drop(phone_number)
+        if self.response_cache is not None:
+            self.response_cache.drop(phone_number)
+        return stats
+
+    async def purge_external(self, phone_number: str) -> Dict[str, int]:
+        """Delete the patient's vector records and stored images"""
+        stats = {}
+        if self.index is not None:
+            stats["vectors"] = await self._purge_vectors(phone_number)
+        if self.storage is not None:
+            try:
+                stats["images"] = await self.storage.delete_prefix(
+                    f"{self.image_prefix}{phone_number}/"
+                )
+            except Exception as e:
+                logging.error(f"Error deleting images for {phone_number}: {e}")
+        return stats
+
+    async def _purge_vectors(self, phone_number: str) -> int:
+        deleted = 0
+        if self.use_namespaces:
+            try:
+                await asyncio.to_thread(
+                    self.index.delete,
+                    delete_all=True,
+                    namespace=patient_namespace(phone_number),
+                )
+            except Exception as e:
+                # Deleting a namespace that was never written raises on Pinecone
+                logging.error(f"Error deleting namespace for {phone_number}: {e}")
+
+        # Records in the default namespace: prefixed ids first, then legacy ones
+        try:
+            ids = await self.history_reader.list_ids(phone_number)
+            for i in range(0, len(ids), DELETE_BATCH_SIZE):
+                await asyncio.to_thread(
+                    self.index.delete, ids=ids[i : i + DELETE_BATCH_SIZE]
+                )
+            deleted += len(ids)
+        except Exception as e:
+            logging.error(f"Error deleting vectors for {phone_number}: {e}")
+        try:
+            await asyncio.to_thread(
+                self.index.delete, filter={"phone_number": {"$eq": phone_number}}
+            )
+        except Exception as e:
+            # Serverless indexes don't support delete by metadata filter
+            logging.error(f"Error deleting legacy vectors for {phone_number}: {e}")
+        return deleted
@@ -0,0 +1,50 @@
+# app/services/patients.py
+import hashlib
+import threading
+import uuid
+from datetime import datetime
+from typing import Optional
+
+RECORD_ID_SEPARATOR = "#"
+
+# Last (epoch ms, sequence) issued by new_record_id in this process
+_last_issued = [0, 0]
+_issue_lock = threading.Lock()
+
+
+def patient_key(phone_number: str) -> str:
+    """Stable key for a patient, safe to use in ids and names.
+
+    This is a plain hash, so it keeps phone numbers out of ids and key names
+    but is not secret: phone numbers are easy to enumerate, and anyone with
+    the keys can recover them by brute force. Treat keys as personal data.
+    """
+    return hashlib.sha256(phone_number.encode("utf-8")).hexdigest()[:24]
+
+
+def patient_namespace(phone_number: str) -> str:
+    """Vector index namespace holding one patient's records"""
+    return f"patient-{patient_key(phone_number)}"
+
+
+def record_id_prefix(phone_number: str) -> str:
+    """Prefix shared by every vector id of one patient"""
+    return f"{patient_key(phone_number)}{RECORD_ID_SEPARATOR}"
+
+
+def new_record_id(phone_number: str, created_at: Optional[datetime] = None) -> str:
+    """Vector id of the form ``<patient key>#<epoch ms>#<sequence><random>``.
+
+    The zero-padded timestamp makes ids of one patient sort in date order;
+    the sequence, reset every millisecond, keeps ids created within the same
+    millisecond in creation order.
+    """
+    created_at = created_at or datetime.now()
+    epoch_ms = int(created_at.timestamp() * 1000)
+    with _issue_lock:
+        sequence = _last_issued[1] + 1 if _last_issued[0] == epoch_ms else 0
+        _last_issued[:] = [epoch_ms, sequence]
+    return (
+        f"{record_id_prefix(phone_number)}{epoch_ms:013d}{RECORD_ID_SEPARATOR}"
+        f"{sequence:04d}{uuid.uuid4().hex[:8]}"
+    )
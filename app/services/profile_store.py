@@ -0,0 +1,197 @@
+# app/services/profile_store.py
+import json
+import logging
+from datetime import datetime
+from typing import Dict, List, Optional, Set
+
+from app.services.patients import patient_key
+
+PROFILE_CATEGORIES = ("conditions", "symptoms", "medications", "incidents", "body_parts")
+
+
+def normalize_entities(values) -> List[str]:
+    """Coerce an extracted category into a de-duplicated list of clean strings"""
+    if not values:
+        return []
+    if isinstance(values, str):
+        values = [values]
+    entities = []
+    for value in values:
+        if isinstance(value, dict):
+            value = value.get("name") or next(iter(value.values()), "")
+        entity = str(value).strip().lower()
+        if entity and entity not in entities:
+            entities.append(entity)
+    return entities
+
+
+class PatientProfileStore:
+    """Incrementally maintained per-patient profile in Redis.
+
+    Every processed message updates, in one pipelined transaction:
+
+    - ``profile:<key>:counts``      HASH ``<category>:<entity>`` -> mentions
+    - ``profile:<key>:first_seen``  HASH ``<category>:<entity>`` -> ISO date
+    - ``profile:<key>:last_seen``   HASH ``<category>:<entity>`` -> ISO date
+    - ``profile:<key>:events``      ZSET of event JSON scored by timestamp
+    - ``profile:<key>:hydrated``    set once records that predate the profile
+                                    have been backfilled from the vector index
+
+    so reports read O(profile) data instead of scanning the vector index.
+    """
+
+    def __init__(self, redis_client, max_events: int = 5000):
+        self.redis = redis_client
+        self.max_events = max_events
+
+    @staticmethod
+    def key_prefix(phone_number: str) -> str:
+        return f"profile:{patient_key(phone_number)}:"
+
+    @classmethod
+    def keys(cls, phone_number: str) -> List[str]:
+        """Every Redis key holding the patient's profile"""
+        prefix = cls.key_prefix(phone_number)
+        return [
+            f"{prefix}{name}"
+            for name in ("counts", "first_seen", "last_seen", "events", "hydrated")
+        ]
+
+    async def record(
+        self,
+        phone_number: str,
+        medical_context: Dict,
+        content: str,
+        record_id: Optional[str] = None,
+        medical_relevance: str = "general",
+        created_at: Optional[datetime] = None,
+    ):
+        """Fold one processed message into the patient's profile"""
+        created_at = created_at or datetime.now()
+        date = created_at.isoformat()
+        prefix = self.key_prefix(phone_number)
+
+        pipe = self.redis.pipeline(transaction=True)
+        for category in PROFILE_CATEGORIES:
+            for entity in normalize_entities(medical_context.get(category)):
+                field = f"{category}:{entity}"
+                pipe.hincrby(f"{prefix}counts", field, 1)
+                pipe.hsetnx(f"{prefix}first_seen", field, date)
+                pipe.hset(f"{prefix}last_seen", field, date)
+
+        event = {
+            "id": record_id,
+            "date": date,
+            "content": content,
+            "type": medical_relevance,
+            "image_url": medical_context.get("image_url"),
+        }
+        pipe.zadd(f"{prefix}events", {json.dumps(event): created_at.timestamp()})
+        if self.max_events:
+            # Keep only the newest max_events entries
+            pipe.zremrangebyrank(f"{prefix}events", 0, -self.max_events - 1)
+        await pipe.execute()
+
+    async def is_hydrated(self, phone_number: str) -> bool:
+        """Whether the profile covers every record in the vector index"""
+        return bool(await self.redis.exists(f"{self.key_prefix(phone_number)}hydrated"))
+
+    async def mark_hydrated(self, phone_number: str):
+        await self.redis.set(f"{self.key_prefix(phone_number)}hydrated", 1)
+
+    async def event_ids(self, phone_number: str) -> Set[str]:
+        """Record ids already folded into the profile"""
+        events = await self.redis.zrange(f"{self.key_prefix(phone_number)}events", 0, -1)
+        ids = set()
+        for raw_event in events:
+            try:
+                record_id = json.loads(_decode(raw_event)).get("id")
+            except ValueError:
+                continue
+            if record_id:
+                ids.add(record_id)
+        return ids
+
+    async def record_metadata(self, phone_number: str, metadata: Dict):
+        """Fold a stored vector record (its index metadata) into the profile"""
+        date = metadata.get("date") or metadata.get("created_at")
+        try:
+            created_at = datetime.fromisoformat(date) if date else None
+        except ValueError:
+            created_at = None
+        condition = metadata.get("condition") or ""
+        await self.record(
+            phone_number,
+            {
+                "conditions": [c for c in condition.split(", ") if c],
+                "symptoms": metadata.get("symptoms"),
+                "medications": metadata.get("medications"),
+                "body_parts": metadata.get("body_parts"),
+                "image_url": metadata.get("image_url") or None,
+            },
+            content=metadata.get("content", ""),
+            record_id=metadata.get("id"),
+            medical_relevance=metadata.get("medical_relevance", "general"),
+            created_at=created_at,
+        )
+
+    async def get_entities(self, phone_number: str) -> List[str]:
+        """The patient's ``<category>:<entity>`` fields, without the event log"""
+        fields = await self.redis.hkeys(f"{self.key_prefix(phone_number)}counts")
+        return sorted(_decode(field) for field in fields)
+
+    async def get_profile(self, phone_number: str) -> Dict:
+        """Read the whole profile in one round-trip"""
+        prefix = self.key_prefix(phone_number)
+        pipe = self.redis.pipeline(transaction=False)
+        pipe.hgetall(f"{prefix}counts")
+        pipe.hgetall(f"{prefix}first_seen")
+        pipe.hgetall(f"{prefix}last_seen")
+        pipe.zrange(f"{prefix}events", 0, -1)
+        counts, first_seen, last_seen, events = await pipe.execute()
+
+        profile = {category: [] for category in PROFILE_CATEGORIES}
+        for raw_field, count in counts.items():
+            field = _decode(raw_field)
+            category, _, entity = field.partition(":")
+            if category not in profile:
+                continue
+            profile[category].append(
+                {
+                    "name": entity,
+                    "count": int(count),
+                    "first_seen": _decode(first_seen.get(raw_field)),
+                    "last_seen": _decode(last_seen.get(raw_field)),
+                }
+            )
+        for category in PROFILE_CATEGORIES:
+            profile[category].sort(key=lambda entry: entry["count"], reverse=True)
+
+        profile["events"] = []
+        for raw_event in events:
+            try:
+                profile["events"].append(json.loads(_decode(raw_event)))
+            except ValueError as e:
+                logging.error(f"Skipping malformed profile event: {e}")
+        return profile
+
+    @staticmethod
+    def to_medical_history(profile: Dict) -> Dict:
+        """Shape a profile like ``collect_medical_history`` output for reports"""
+        medical_history = {
+            category: [entry["name"] for entry in profile.get(category, [])]
+            for category in PROFILE_CATEGORIES
+        }
+        medical_history["chronological_events"] = [
+            {
+                "date": event.get("date"),
+                "content": event.get("content", ""),
+                "type": event.get("type", "general"),
+            }
+            for event in profile.get("events", [])
+        ]
+        return medical_history
+
+
+def _decode(value):
+    return value.decode("utf-8") if isinstance(value, bytes) else value
@@ -0,0 +1,120 @@
+# app/services/resilience.py
+import asyncio
+import math
+import time
+from collections import deque
+from typing import Awaitable, Callable, Dict, Optional
+
+
+class CircuitOpenError(RuntimeError):
+    """Raised without calling the provider while its circuit is open"""
+
+
+class LatencyTracker:
+    """Rolling window of successful call latencies, in seconds"""
+
+    def __init__(self, window: int = 200):
+        self.samples = deque(maxlen=window)
+
+    def __len__(self):
+        return len(self.samples)
+
+    def record(self, seconds: float):
+        self.samples.append(seconds)
+
+    def percentile(self, percentile: float) -> Optional[float]:
+        if not self.samples:
+            return None
+        ordered = sorted(self.samples)
+        rank = max(0, math.ceil(percentile / 100 * len(ordered)) - 1)
+        return ordered[rank]
+
+
+class CircuitBreaker:
+    """Closed -> open after ``failure_threshold`` consecutive failures.
+
+    While open, calls are rejected for ``recovery_seconds``; then one probe
+    call is let through (half-open) and its outcome closes or re-opens the
+    circuit.
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, failure_threshold: int = 5, recovery_seconds: float = 30):
+        self.failure_threshold = failure_threshold
+        self.recovery_seconds = recovery_seconds
+        self.state = self.CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self.rejected = 0
+        self._probing = False
+
+    def allow(self) -> bool:
+        if self.state == self.OPEN:
+            if time.monotonic() - self.opened_at < self.recovery_seconds:
+                self.rejected += 1
+                return False
+            self.state = self.HALF_OPEN
+        if self.state == self.HALF_OPEN:
+            if self._probing:
+                self.rejected += 1
+                return False
+            self._probing = True
+        return True
+
+    def record_success(self):
+        self.state = self.CLOSED
+        self.failures = 0
+        self._probing = False
+
+    def record_failure(self):
+        self.failures += 1
+        self._probing = False
+        if self.state == self.HALF_OPEN or self.failures >= self.failure_threshold:
+            self.state = self.OPEN
+            self.opened_at = time.monotonic()
+
+    def release_probe(self):
+        """Let another half-open probe through if this one ended without a verdict"""
+        self._probing = False
+
+    def stats(self) -> Dict:
+        return {"state": self.state, "failures": self.failures, "rejected": self.rejected}
+
+
+async def hedged(
+    call: Callable[[], Awaitable],
+    hedge_after: Optional[float],
+    can_hedge: Callable[[], bool] = lambda: True,
+    on_hedge: Optional[Callable[[], None]] = None,
+):
+    """Await call(); if it is still running after hedge_after seconds, race a duplicate.
+
+    The first successful result wins and the other attempt is cancelled. If
+    one attempt fails, the other is still awaited.
+    """
+    attempts = [asyncio.ensure_future(call())]
+    try:
+        if hedge_after is not None:
+            done, _ = await asyncio.wait(attempts, timeout=hedge_after)
+            if not done and can_hedge():
+                if on_hedge is not None:
+                    on_hedge()
+                attempts.append(asyncio.ensure_future(call()))
+
+        pending = set(attempts)
+        error = None
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for attempt in done:
+                if attempt.exception() is None:
+                    return attempt.result()
+                error = attempt.exception()
+        raise error
+    finally:
+        # Also runs when the caller's deadline cancels us
+        for attempt in attempts:
+            if not attempt.done():
+                attempt.cancel()
@@ -0,0 +1,185 @@
+# app/services/response_cache.py
+import hashlib
+import re
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+
+# Words that point back at earlier turns; a query containing one only makes
+# sense together with the raw conversation, so it is never cached
+FOLLOW_UP_WORDS = frozenset(
+    "it its it's that this these those they them their he him his she her "
+    "one ones same again else another".split()
+)
+
+_WORD = re.compile(r"[a-z']+")
+
+
+def is_self_contained(query: str) -> bool:
+    """True when the query can be answered without the preceding turns"""
+    return not any(word in FOLLOW_UP_WORDS for word in _WORD.findall(query.lower()))
+
+
+def context_fingerprint(*parts: Iterable[str]) -> str:
+    """Stable hash of the patient context a cached reply was written against"""
+    digest = hashlib.sha256()
+    for part in parts:
+        values = [part] if isinstance(part, str) else sorted(part)
+        for value in values:
+            digest.update(value.encode("utf-8"))
+            digest.update(b"\x00")
+        digest.update(b"\x01")
+    return digest.hexdigest()[:32]
+
+
+@dataclass
+class _CachedReply:
+    query: str
+    response: str
+    expires_at: float
+
+
+class _Bucket:
+    """Replies for one (patient, context fingerprint) with a unit-norm matrix"""
+
+    def __init__(self):
+        self.replies: List[_CachedReply] = []
+        self.vectors: Optional[np.ndarray] = None
+
+    def __len__(self):
+        return len(self.replies)
+
+    def add(self, vector: np.ndarray, reply: _CachedReply, max_size: int):
+        self.replies.append(reply)
+        stacked = vector[None, :]
+        self.vectors = stacked if self.vectors is None else np.vstack([self.vectors, stacked])
+        if len(self.replies) > max_size:
+            self.keep(range(len(self.replies) - max_size, len(self.replies)))
+
+    def keep(self, positions):
+        positions = list(positions)
+        self.replies = [self.replies[i] for i in positions]
+        self.vectors = self.vectors[positions] if positions else None
+
+
+class SemanticResponseCache:
+    """Nearest-neighbour cache of replies, scoped per patient and context.
+
+    Entries are keyed by phone number plus a fingerprint of the patient
+    context (rolling summary and profile entities), so a reply is never served
+    to another patient or after the patient's history has changed. Only
+    self-contained queries are cached; see ``is_self_contained``. A lookup
+    is a cosine top-1 over that bucket's query embeddings and hits only at or
+    above ``threshold``. Entries expire after ``ttl_seconds``; the cache holds
+    at most ``max_entries`` replies, evicting least recently used buckets.
+    """
+
+    def __init__(
+        self,
+        threshold: float = 0.95,
+        ttl_seconds: float = 3600,
+        max_entries: int = 10000,
+        max_per_patient: int = 50,
+    ):
+        self.threshold = threshold
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.max_per_patient = max_per_patient
+        self._buckets: "OrderedDict[Tuple[str, str], _Bucket]" = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+        self.stores = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    @staticmethod
+    def _normalize(vector) -> Optional[np.ndarray]:
+        array = np.asarray(vector, dtype=np.float32)
+        norm = float(np.linalg.norm(array))
+        return array / norm if norm else None
+
+    def _expire(self, bucket: _Bucket, now: float):
+        live = [i for i, reply in enumerate(bucket.replies) if reply.expires_at > now]
+        if len(live) != len(bucket):
+            expired = len(bucket) - len(live)
+            self.expirations += expired
+            self._size -= expired
+            bucket.keep(live)
+
+    def lookup(self, phone_number: str, fingerprint: str, vector) -> Optional[str]:
+        """Cached reply for a near-identical query in the same context, if any"""
+        query = self._normalize(vector)
+        with self._lock:
+            key = (phone_number, fingerprint)
+            bucket = self._buckets.get(key)
+            if bucket is not None:
+                self._expire(bucket, time.monotonic())
+                if not len(bucket):
+                    del self._buckets[key]
+                    bucket = None
+            if bucket is None or query is None:
+                self.misses += 1
+                return None
+
+            scores = bucket.vectors @ query
+            best = int(np.argmax(scores))
+            if scores[best] < self.threshold:
+                self.misses += 1
+                return None
+            self._buckets.move_to_end(key)
+            self.hits += 1
+            return bucket.replies[best].response
+
+    def store(self, phone_number: str, fingerprint: str, query: str, vector, response: str):
+        normalized = self._normalize(vector)
+        if normalized is None or not response:
+            return
+        with self._lock:
+            key = (phone_number, fingerprint)
+            bucket = self._buckets.get(key)
+            if bucket is None:
+                bucket = self._buckets[key] = _Bucket()
+            self._buckets.move_to_end(key)
+            before = len(bucket)
+            bucket.add(
+                normalized,
+                _CachedReply(query, response, time.monotonic() + self.ttl_seconds),
+                self.max_per_patient,
+            )
+            self._size += len(bucket) - before
+            self.stores += 1
+            self._evict()
+
+    def _evict(self):
+        while self._size > self.max_entries and self._buckets:
+            _, bucket = self._buckets.popitem(last=False)
+            self._size -= len(bucket)
+            self.evictions += len(bucket)
+
+    def drop(self, phone_number: str):
+        """Forget every cached reply for a patient"""
+        with self._lock:
+            for key in [key for key in self._buckets if key[0] == phone_number]:
+                self._size -= len(self._buckets.pop(key))
+
+    def stats(self) -> Dict:
+        lookups = self.hits + self.misses
+        return {
+            "size": self._size,
+            "max_entries": self.max_entries,
+            "threshold": self.threshold,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            "stores": self.stores,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+        }
@@ -1,39 +1,188 @@
+from abc import ABC, abstractmethod
 from botocore.config import Config
+from boto3.s3.transfer import TransferConfig
+from functools import lru_cache
+from pathlib import Path
+from typing import Dict, Optional
+import asyncio
 import boto3
+import io
 import logging
 from app.core.config import get_settings
 
 settings = get_settings()
 
+MB = 1024 * 1024
 
-class S3Service:
+
+class StorageService(ABC):
+    """Interface shared by the S3, local filesystem and in-memory backends"""
+
+    @abstractmethod
+    async def upload_file(
+        self, key: str, data: bytes, content_type: str = "image/jpeg"
+    ) -> str:
+        """Store data under key; returns its URL"""
+
+    @abstractmethod
+    async def delete_prefix(self, prefix: str) -> int:
+        """Delete every object whose key starts with prefix; returns the count"""
+
+    async def health_check(self):
+        """Validate the backend is reachable; called once at startup"""
+
+
+class S3Service(StorageService):
     def __init__(self):
-        self.client = self._initialize_client()
+        self._client = None
+        self.transfer_config = TransferConfig(
+            multipart_threshold=settings.S3_MULTIPART_THRESHOLD_MB * MB,
+            multipart_chunksize=settings.S3_MULTIPART_CHUNKSIZE_MB * MB,
+            max_concurrency=settings.S3_MAX_CONCURRENCY,
+        )
+
+    @property
+    def client(self):
+        """Lazily created client; its connection pool is shared by all uploads"""
+        if self._client is None:
+            self._client = self._initialize_client()
+        return self._client
 
     def _initialize_client(self):
         try:
-            client = boto3.client(
+            return boto3.client(
                 "s3",
                 aws_access_key_id=settings.AWS_ACCESS_KEY,
                 aws_secret_access_key=settings.AWS_SECRET_KEY,
                 config=Config(
-                    signature_version="s3v4", region_name=settings.AWS_REGION
+                    signature_version="s3v4",
+                    region_name=settings.AWS_REGION,
+                    max_pool_connections=settings.S3_MAX_POOL_CONNECTIONS,
                 ),
             )
-            client.head_bucket(Bucket=settings.S3_BUCKET)
-            return client
         except Exception as e:
             logging.error(f"S3 initialization error: {e}")
             raise Exception(f"Failed to initialize S3: {str(e)}")
 
+    async def health_check(self):
+        try:
+            await asyncio.to_thread(self.client.head_bucket, Bucket=settings.S3_BUCKET)
+        except Exception as e:
+            logging.error(f"S3 health check failed: {e}")
+            raise Exception(f"Failed to initialize S3: {str(e)}")
+
     async def upload_file(
         self, key: str, data: bytes, content_type: str = "image/jpeg"
-    ):
+    ) -> str:
         try:
-            self.client.put_object(
-                Bucket=settings.S3_BUCKET, Key=key, Body=data, ContentType=content_type
+            # upload_fileobj switches to a multipart upload above the threshold;
+            # it runs in a worker thread so the event loop is never blocked
+            await asyncio.to_thread(
+                self.client.upload_fileobj,
+                io.BytesIO(data),
+                settings.S3_BUCKET,
+                key,
+                ExtraArgs={"ContentType": content_type},
+                Config=self.transfer_config,
             )
             return f"https://{settings.S3_BUCKET}.s3.{settings.AWS_REGION}.amazonaws.com/{key}"
         except Exception as e:
             logging.error(f"S3 upload error: {e}")
             raise Exception(f"Failed to upload to S3: {str(e)}")
+
+    def _delete_prefix(self, prefix: str) -> int:
+        deleted = 0
+        paginator = self.client.get_paginator("list_objects_v2")
+        for page in paginator.paginate(Bucket=settings.S3_BUCKET, Prefix=prefix):
+            objects = [{"Key": obj["Key"]} for obj in page.get("Contents", [])]
+            if objects:
+                # A listing page holds at most 1000 keys, the delete_objects limit
+                self.client.delete_objects(
+                    Bucket=settings.S3_BUCKET,
+                    Delete={"Objects": objects, "Quiet": True},
+                )
+                deleted += len(objects)
+        return deleted
+
+    async def delete_prefix(self, prefix: str) -> int:
+        try:
+            return await asyncio.to_thread(self._delete_prefix, prefix)
+        except Exception as e:
+            logging.error(f"S3 delete error: {e}")
+            raise Exception(f"Failed to delete from S3: {str(e)}")
+
+
+class LocalStorageService(StorageService):
+    """Stores objects under a local directory; intended for development and tests"""
+
+    def __init__(self, root: Optional[str] = None):
+        self.root = Path(root or settings.LOCAL_STORAGE_DIR).resolve()
+
+    def _write(self, path: Path, data: bytes):
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_bytes(data)
+
+    async def health_check(self):
+        await asyncio.to_thread(self.root.mkdir, parents=True, exist_ok=True)
+
+    async def upload_file(
+        self, key: str, data: bytes, content_type: str = "image/jpeg"
+    ) -> str:
+        path = self.root / key
+        try:
+            await asyncio.to_thread(self._write, path, data)
+            return path.as_uri()
+        except Exception as e:
+            logging.error(f"Local storage upload error: {e}")
+            raise Exception(f"Failed to store file locally: {str(e)}")
+
+    def _delete_prefix(self, prefix: str) -> int:
+        deleted = 0
+        # Only walk the deepest directory the prefix names
+        base = self.root / prefix.rpartition("/")[0]
+        if not base.is_dir():
+            return 0
+        for path in list(base.rglob("*")):
+            if path.is_file() and path.relative_to(self.root).as_posix().startswith(prefix):
+                path.unlink()
+                deleted += 1
+        return deleted
+
+    async def delete_prefix(self, prefix: str) -> int:
+        try:
+            return await asyncio.to_thread(self._delete_prefix, prefix)
+        except Exception as e:
+            logging.error(f"Local storage delete error: {e}")
+            raise Exception(f"Failed to delete local files: {str(e)}")
+
+
+class InMemoryStorageService(StorageService):
+    """Keeps objects in a dict; intended for tests"""
+
+    def __init__(self):
+        self.objects: Dict[str, Dict] = {}
+
+    async def upload_file(
+        self, key: str, data: bytes, content_type: str = "image/jpeg"
+    ) -> str:
+        self.objects[key] = {"data": data, "content_type": content_type}
+        return f"memory://{key}"
+
+    async def delete_prefix(self, prefix: str) -> int:
+        doomed = [key for key in self.objects if key.startswith(prefix)]
+        for key in doomed:
+            del self.objects[key]
+        return len(doomed)
+
+
+@lru_cache()
+def get_storage_service() -> StorageService:
+    """Return the storage backend selected by STORAGE_BACKEND"""
+    backend = settings.STORAGE_BACKEND.lower()
+    if backend == "s3":
+        return S3Service()
+    if backend == "local":
+        return LocalStorageService()
+    if backend == "memory":
+        return InMemoryStorageService()
+    raise ValueError(f"Unknown storage backend: {settings.STORAGE_BACKEND}")
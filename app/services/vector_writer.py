@@ -0,0 +1,206 @@
+# app/services/vector_writer.py
+import asyncio
+import logging
+import math
+import time
+from collections import defaultdict
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional
+
+
+@dataclass
+class VectorMatch:
+    """Query match with the same attributes as a Pinecone ``ScoredVector``"""
+
+    id: str
+    score: float
+    metadata: Dict = field(default_factory=dict)
+    values: List[float] = field(default_factory=list)
+
+
+def cosine_similarity(a: List[float], b: List[float]) -> float:
+    dot = sum(x * y for x, y in zip(a, b))
+    norm = math.sqrt(sum(x * x for x in a)) * math.sqrt(sum(y * y for y in b))
+    return dot / norm if norm else 0.0
+
+
+class VectorWriter:
+    """Write-behind buffer for Pinecone upserts.
+
+    Vectors from every session are collected and flushed in batches of up to
+    ``batch_size`` or every ``flush_interval_ms``; batches are sent in
+    parallel and retried with backoff. Vectors stay visible to
+    ``recent_matches`` until a grace period after their flush so a query right
+    after an upsert still sees the patient's newest record.
+    """
+
+    def __init__(
+        self,
+        index,
+        batch_size: int = 100,
+        flush_interval_ms: float = 200,
+        max_retries: int = 3,
+        max_parallel_flushes: int = 4,
+        visibility_grace_seconds: float = 10.0,
+    ):
+        self.index = index
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval_ms / 1000
+        self.max_retries = max_retries
+        self.flush_semaphore = asyncio.Semaphore(max_parallel_flushes)
+        self.visibility_grace_seconds = visibility_grace_seconds
+
+        self._buffer: List[tuple] = []
+        # Vectors that are buffered or recently flushed, by phone number
+        self._recent: Dict[str, Dict[str, tuple]] = defaultdict(dict)
+        self._flusher: Optional[asyncio.Task] = None
+        self._wakeup = asyncio.Event()
+        self._inflight: set = set()
+
+        self.flushed = 0
+        self.failed = 0
+
+    def start(self):
+        if self._flusher is None:
+            self._flusher = asyncio.create_task(self._run(), name="vector-writer")
+
+    async def close(self):
+        """Flush everything still buffered; called on shutdown"""
+        if self._flusher is not None:
+            self._flusher.cancel()
+            await asyncio.gather(self._flusher, return_exceptions=True)
+            self._flusher = None
+        await self.flush()
+
+    def add(self, vector: dict, namespace: str = ""):
+        """Buffer a vector for the next flush"""
+        self._buffer.append((namespace, vector))
+        phone_number = vector.get("metadata", {}).get("phone_number")
+        if phone_number:
+            # Expiry is set once the vector has actually been flushed
+            self._recent[phone_number][vector["id"]] = (vector, math.inf)
+        if self._flusher is None:
+            self.start()
+        if len(self._buffer) >= self.batch_size:
+            self._wakeup.set()
+
+    def discard(self, phone_number: str) -> int:
+        """Drop a patient's buffered vectors before they are flushed"""
+        kept = [
+            (namespace, vector)
+            for namespace, vector in self._buffer
+            if vector.get("metadata", {}).get("phone_number") != phone_number
+        ]
+        dropped = len(self._buffer) - len(kept)
+        self._buffer = kept
+        self._recent.pop(phone_number, None)
+        return dropped
+
+    async def flush(self):
+        """Send every buffered vector now and wait for periodic flushes in flight"""
+        await self._flush_buffer()
+        current = asyncio.current_task()
+        inflight = [task for task in self._inflight if task is not current]
+        if inflight:
+            await asyncio.gather(*inflight, return_exceptions=True)
+
+    async def _flush_buffer(self):
+        """Send the buffered vectors in parallel batches"""
+        batch, self._buffer = self._buffer, []
+        by_namespace: Dict[str, List[dict]] = defaultdict(list)
+        for namespace, vector in batch:
+            by_namespace[namespace].append(vector)
+        chunks = [
+            (namespace, vectors[i : i + self.batch_size])
+            for namespace, vectors in by_namespace.items()
+            for i in range(0, len(vectors), self.batch_size)
+        ]
+        if chunks:
+            await asyncio.gather(
+                *(self._flush_chunk(chunk, namespace) for namespace, chunk in chunks)
+            )
+
+    async def _run(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            self._prune(time.monotonic())
+            if self._buffer:
+                task = asyncio.create_task(self._flush_buffer())
+                self._inflight.add(task)
+                task.add_done_callback(self._inflight.discard)
+
+    async def _flush_chunk(self, chunk: List[dict], namespace: str = ""):
+        async with self.flush_semaphore:
+            for attempt in range(self.max_retries + 1):
+                try:
+                    await asyncio.to_thread(
+                        self.index.upsert, vectors=chunk, namespace=namespace
+                    )
+                    self.flushed += len(chunk)
+                    self._mark_flushed(chunk)
+                    return
+                except Exception as e:
+                    if attempt == self.max_retries:
+                        self.failed += len(chunk)
+                        logging.error(
+                            f"Dropping {len(chunk)} vectors after {attempt + 1} upsert attempts: {e}"
+                        )
+                        self._forget(chunk)
+                        return
+                    delay = 0.2 * (2**attempt)
+                    logging.warning(f"Vector upsert failed, retrying in {delay:.1f}s: {e}")
+                    await asyncio.sleep(delay)
+
+    def _mark_flushed(self, chunk: List[dict]):
+        expires_at = time.monotonic() + self.visibility_grace_seconds
+        for vector in chunk:
+            phone_number = vector.get("metadata", {}).get("phone_number")
+            if phone_number and vector["id"] in self._recent.get(phone_number, {}):
+                self._recent[phone_number][vector["id"]] = (vector, expires_at)
+
+    def _forget(self, chunk: List[dict]):
+        for vector in chunk:
+            phone_number = vector.get("metadata", {}).get("phone_number")
+            self._recent.get(phone_number, {}).pop(vector["id"], None)
+
+    def _prune(self, now: float):
+        for phone_number in list(self._recent):
+            records = self._recent[phone_number]
+            for vector_id in [vid for vid, (_, exp) in records.items() if exp <= now]:
+                del records[vector_id]
+            if not records:
+                del self._recent[phone_number]
+
+    def recent_matches(self, phone_number: str, vector: List[float]) -> List[VectorMatch]:
+        """Score this patient's buffered and just-flushed vectors against a query"""
+        records = self._recent.get(phone_number)
+        if not records:
+            return []
+
+        now = time.monotonic()
+        for vector_id in [vid for vid, (_, exp) in records.items() if exp <= now]:
+            del records[vector_id]
+
+        return [
+            VectorMatch(
+                id=record["id"],
+                score=cosine_similarity(vector, record["values"]),
+                metadata=record.get("metadata", {}),
+                values=record["values"],
+            )
+            for record, _ in records.values()
+        ]
+
+    @staticmethod
+    def merge_matches(matches, recent: List[VectorMatch], top_k: int) -> list:
+        """Merge index matches with recent local matches, de-duplicated by id"""
+        merged = {match.id: match for match in matches}
+        for match in recent:
+            merged.setdefault(match.id, match)
+        return sorted(merged.values(), key=lambda match: match.score, reverse=True)[
+            :top_k
+        ]
@@ -1,14 +1,25 @@
+from dataclasses import dataclass
 from enum import Enum
 from typing import Optional, Dict
-from openai import OpenAI
-import requests
+from openai import AsyncOpenAI
+import httpx
 import logging
-import os
 from app.core.config import get_settings
+from app.core.http import get_http_client
 
 settings = get_settings()
 
 
+@dataclass(frozen=True)
+class Media:
+    """A WhatsApp media object fetched once and shared by every consumer"""
+
+    id: str
+    url: str
+    mime_type: str
+    data: bytes
+
+
 class WhatsAppService:
     def __init__(self):
         self.base_url = f"https://graph.facebook.com/v21.0/{settings.PHONE_NUMBER_ID}"
@@ -16,45 +27,40 @@ class WhatsAppService:
             "Authorization": f"Bearer {settings.WHATSAPP_API_KEY}",  # Move token to settings
             "Content-Type": "application/json",
         }
-        self.openai_client = OpenAI(api_key=settings.OPENAI_API_KEY)
+        self.openai_client = AsyncOpenAI(api_key=settings.OPENAI_API_KEY)
+
+    @property
+    def http(self) -> httpx.AsyncClient:
+        """Shared keep-alive client owned by the app lifespan"""
+        return get_http_client()
 
-    async def handle_audio_message(self, media_id: str, message_id: str) -> Dict:
+    async def handle_audio_message(
+        self, media_id: str, message_id: str, media: Optional["Media"] = None
+    ) -> Dict:
         """Handle audio message using OpenAI's Whisper"""
         try:
-            # Get audio content
-            audio_content = await self.download_media(media_id)
-
-            # Save temporarily with .ogg extension (WhatsApp audio format)
-            temp_file = f"temp_{message_id}.ogg"
-            with open(temp_file, "wb") as f:
-                f.write(audio_content)
+            # Get audio content (single fetch; reuse the buffer if already fetched)
+            media = media or await self.fetch_media(media_id)
 
-            # Open and transcribe with OpenAI
-            with open(temp_file, "rb") as audio_file:
-                transcription = self.openai_client.audio.transcriptions.create(
-                    model="whisper-1", file=audio_file
-                )
-
-            # Clean up temp file
-            os.remove(temp_file)
+            # Transcribe straight from memory, no temp file round-trip
+            transcription = await self.openai_client.audio.transcriptions.create(
+                model="whisper-1",
+                file=(f"{message_id}.ogg", media.data, media.mime_type),
+            )
 
             return {"text": transcription.text, "success": True}
 
         except Exception as e:
             logging.error(f"Audio handling error: {e}")
             return {"error": str(e), "success": False}
-        finally:
-            # Ensure temp file is removed even if there's an error
-            if os.path.exists(temp_file):
-                os.remove(temp_file)
 
-    async def get_media_url(self, media_id: str) -> str:
-        """Get media URL from WhatsApp API"""
+    async def resolve_media(self, media_id: str) -> Dict:
+        """Resolve media metadata (download URL, mime type, size) from WhatsApp API"""
         try:
             # Correct URL format for media
             url = f"https://graph.facebook.com/v21.0/{media_id}"
 
-            response = requests.get(url, headers=self.headers)
+            response = await self.http.get(url, headers=self.headers)
             response.raise_for_status()
 
             media_data = response.json()
@@ -63,44 +69,71 @@ class WhatsAppService:
                 logging.error(f"No URL in media response: {media_data}")
                 raise Exception("Media URL not found in response")
 
-            # Get the actual media file
-            media_url = media_data["url"]
-            media_response = requests.get(
-                media_url,
-                headers={"Authorization": f"Bearer {settings.WHATSAPP_API_KEY}"},
-            )
-            media_response.raise_for_status()
-
-            return media_url
+            return media_data
 
-        except requests.exceptions.RequestException as e:
+        except httpx.HTTPError as e:
             logging.error(f"Error getting media URL: {str(e)}")
             logging.error(
-                f"Response content: {e.response.content if hasattr(e, 'response') else 'No response'}"
+                f"Response content: {e.response.content if isinstance(e, httpx.HTTPStatusError) else 'No response'}"
             )
             raise Exception(f"Failed to get media URL: {str(e)}")
         except Exception as e:
             logging.error(f"Unexpected error getting media URL: {str(e)}")
             raise Exception(f"Failed to get media URL: {str(e)}")
 
-    async def download_media(self, media_id: str) -> bytes:
-        """Download media file from WhatsApp"""
+    async def get_media_url(self, media_id: str) -> str:
+        """Get media URL from WhatsApp API"""
+        media_data = await self.resolve_media(media_id)
+        return media_data["url"]
+
+    async def fetch_media(self, media_id: str) -> "Media":
+        """Resolve the media URL once and download the body once.
+
+        The returned buffer is shared as-is by S3 upload, vision analysis and
+        transcription.
+        """
         try:
-            media_url = await self.get_media_url(media_id)
+            media_data = await self.resolve_media(media_id)
+            media_url = media_data["url"]
 
-            # Download the actual media file
-            media_response = requests.get(
+            async with self.http.stream(
+                "GET",
                 media_url,
                 headers={"Authorization": f"Bearer {settings.WHATSAPP_API_KEY}"},
+            ) as media_response:
+                media_response.raise_for_status()
+                declared_size = int(media_response.headers.get("content-length") or 0)
+                if declared_size > settings.MEDIA_MAX_BYTES:
+                    raise Exception(
+                        f"Media too large: {declared_size} bytes (limit {settings.MEDIA_MAX_BYTES})"
+                    )
+                # Content-Length may be missing or wrong (chunked), so count too
+                buffer = bytearray()
+                async for chunk in media_response.aiter_bytes():
+                    buffer.extend(chunk)
+                    if len(buffer) > settings.MEDIA_MAX_BYTES:
+                        raise Exception(
+                            f"Media too large: over {settings.MEDIA_MAX_BYTES} bytes"
+                        )
+                content = bytes(buffer)
+
+            return Media(
+                id=media_id,
+                url=media_url,
+                mime_type=media_data.get("mime_type")
+                or media_response.headers.get("content-type", "application/octet-stream"),
+                data=content,
             )
-            media_response.raise_for_status()
-
-            return media_response.content
 
         except Exception as e:
             logging.error(f"Error downloading media: {str(e)}")
             raise Exception(f"Failed to download media: {str(e)}")
 
+    async def download_media(self, media_id: str) -> bytes:
+        """Download media file from WhatsApp"""
+        media = await self.fetch_media(media_id)
+        return media.data
+
     async def send_message(
         self, phone_number: str, message: str, template: Optional[Dict] = None
     ):
@@ -122,7 +155,7 @@ class WhatsAppService:
             }
 
         try:
-            response = requests.post(url, headers=self.headers, json=data)
+            response = await self.http.post(url, headers=self.headers, json=data)
             response.raise_for_status()
             return response.json()
         except Exception as e:
@@ -142,18 +175,17 @@ class WhatsAppService:
             upload_url = f"{self.base_url}/media"
 
             # Correct upload format
-            files = {
-                "file": ("report.pdf", file_content, "application/pdf"),
-                "messaging_product": (None, "whatsapp"),  # Add this
-                "type": (None, "application/pdf"),  # Add this
-            }
+            files = {"file": ("report.pdf", file_content, "application/pdf")}
+            data = {"messaging_product": "whatsapp", "type": "application/pdf"}
             headers = {
                 "Authorization": f"Bearer {settings.WHATSAPP_API_KEY}"
-                # Remove Content-Type header to let requests set it with boundary
+                # Remove Content-Type header to let httpx set it with boundary
             }
             # Upload file
             logging.info("Uploading document to WhatsApp servers...")
-            upload_response = requests.post(upload_url, headers=headers, files=files)
+            upload_response = await self.http.post(
+                upload_url, headers=headers, data=data, files=files
+            )
             upload_response.raise_for_status()
             logging.info("Document uploaded successfully")
 
@@ -178,7 +210,9 @@ class WhatsAppService:
             }
 
             logging.info("Sending document message...")
-            response = requests.post(message_url, headers=self.headers, json=payload)
+            response = await self.http.post(
+                message_url, headers=self.headers, json=payload
+            )
             response.raise_for_status()
 
             logging.info(f"Document sent successfully to {phone_number}")
@@ -187,9 +221,9 @@ class WhatsAppService:
         except FileNotFoundError:
             logging.error(f"Document not found: {document_path}")
             raise Exception(f"Document not found: {document_path}")
-        except requests.exceptions.RequestException as e:
+        except httpx.HTTPError as e:
             logging.error(f"Error sending document: {str(e)}")
-            if hasattr(e, "response") and e.response:
+            if isinstance(e, httpx.HTTPStatusError):
                 logging.error(f"Response content: {e.response.text}")
             raise Exception(f"Failed to send document: {str(e)}")
         except Exception as e:
@@ -0,0 +1,57 @@
+import pytest
+
+from app.services.fast_path import FastPathExtractor, MessageKind
+
+extractor = FastPathExtractor()
+
+
+@pytest.mark.parametrize(
+    "text, kind",
+    [
+        # Small talk, padded with stopwords and filler
+        ("hi", MessageKind.NO_MEDICAL),
+        ("Thank you", MessageKind.NO_MEDICAL),
+        ("thanks a lot", MessageKind.NO_MEDICAL),
+        ("I'm good thanks", MessageKind.NO_MEDICAL),
+        ("ok see you later", MessageKind.NO_MEDICAL),
+        # Everyday uses of body parts and incidents
+        ("I'm back", MessageKind.NEEDS_LLM),
+        ("see you in the fall", MessageKind.NEEDS_LLM),
+        ("thanks with all my heart", MessageKind.NEEDS_LLM),
+        ("head", MessageKind.NEEDS_LLM),
+        ("my chest", MessageKind.NEEDS_LLM),
+        ("I fell", MessageKind.NEEDS_LLM),
+        # Negations and unknown words
+        ("no fever", MessageKind.NEEDS_LLM),
+        ("stopped taking ibuprofen", MessageKind.NEEDS_LLM),
+        ("I have a cold", MessageKind.NEEDS_LLM),
+        ("headache after the party", MessageKind.NEEDS_LLM),
+        # Obvious medical messages
+        ("I have a headache", MessageKind.OBVIOUS),
+        ("back pain since yesterday", MessageKind.OBVIOUS),
+        ("taking ibuprofen for my migraine", MessageKind.OBVIOUS),
+        ("fever and chest pain", MessageKind.OBVIOUS),
+    ],
+)
+def test_classify(text, kind):
+    assert extractor.classify(text).kind == kind
+
+
+@pytest.mark.parametrize(
+    "text, context",
+    [
+        ("back pain since yesterday", {"symptoms": ["back pain"]}),
+        (
+            "taking ibuprofen for my migraine",
+            {"conditions": ["migraine"], "medications": ["ibuprofen"]},
+        ),
+        (
+            "fever and a swollen knee",
+            {"symptoms": ["fever", "swollen"], "body_parts": ["knee"]},
+        ),
+    ],
+)
+def test_obvious_context(text, context):
+    result = extractor.classify(text)
+    assert result.kind == MessageKind.OBVIOUS
+    assert {category: terms for category, terms in result.context.items() if terms} == context
@@ -0,0 +1,18 @@
+from app.services.lexical_index import LexicalIndex
+
+
+def test_keeps_newest_documents_per_patient():
+    index = LexicalIndex(max_documents_per_patient=2)
+    for day, content in enumerate(["migraine", "asthma attack", "knee pain"], 1):
+        index.add_record("1", f"k#{day:03d}", content, [content], {"content": content})
+    # Hydration can deliver older records after newer ones; those are skipped
+    index.add_record("1", "k#000", "migraine again", ["migraine"], {})
+
+    bm25 = index._indexes["1"]
+    assert sorted(bm25.documents) == ["k#002", "k#003"]
+    assert "migraine" not in bm25.entities
+    assert "migraine" not in bm25.document_frequency
+    assert bm25.total_length == sum(length for _, length, _, _ in bm25.documents.values())
+    matches, exact = index.search("1", "knee pain")
+    assert [match.id for match in matches] == ["k#003"]
+    assert exact == {"knee pain"}
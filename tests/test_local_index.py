@@ -0,0 +1,37 @@
+from datetime import datetime, timedelta
+
+from app.services.local_index import LocalVectorIndex, TieredVectorIndex
+from app.services.patients import new_record_id
+
+
+def _record(phone_number, values, created_at):
+    return {
+        "id": new_record_id(phone_number, created_at),
+        "values": values,
+        "metadata": {"phone_number": phone_number},
+    }
+
+
+def test_query_includes_records_written_before_the_local_tier():
+    remote = LocalVectorIndex(dimension=2)
+    start = datetime(2024, 1, 1)
+    old = _record("1", [1.0, 0.0], start)
+    remote.upsert(vectors=[old, _record("2", [1.0, 0.0], start)])
+
+    tiered = TieredVectorIndex(LocalVectorIndex(dimension=2), remote, page_size=1)
+    recent = [
+        _record("1", [0.0, 1.0], start + timedelta(days=day)) for day in range(1, 4)
+    ]
+    tiered.upsert(vectors=recent)
+
+    response = tiered.query(
+        vector=[1.0, 0.0],
+        top_k=3,
+        filter={"phone_number": {"$eq": "1"}},
+        include_metadata=True,
+    )
+    assert response.matches[0].id == old["id"]
+    assert {match.metadata["phone_number"] for match in response.matches} == {"1"}
+    # Only the queried patient was copied into the local tier
+    assert tiered.local.partition_size("1") == 4
+    assert tiered.local.partition_size("2") == 0
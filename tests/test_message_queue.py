@@ -0,0 +1,53 @@
+import asyncio
+
+from app.services.message_queue import MessageQueue, QueueFullError
+
+
+def test_slow_patient_does_not_block_others():
+    async def scenario():
+        processed = []
+        release = asyncio.Event()
+
+        async def handler(message, phone_number):
+            if message["id"] == "slow":
+                await release.wait()
+            processed.append(message["id"])
+
+        queue = MessageQueue(handler, max_concurrency=2, max_size=10)
+        queue.start()
+        queue.enqueue({"id": "slow"}, "1")
+        queue.enqueue({"id": "a2"}, "1")
+        for i in range(3):
+            queue.enqueue({"id": f"b{i}"}, "2")
+        await asyncio.sleep(0.05)
+        blocked = list(processed)
+        release.set()
+        await queue.stop(timeout=1)
+        return blocked, processed, queue
+
+    blocked, processed, queue = asyncio.run(scenario())
+    assert blocked == ["b0", "b1", "b2"]
+    # The slow patient's next message still waits its turn
+    assert processed == ["b0", "b1", "b2", "slow", "a2"]
+    assert queue.qsize() == 0
+
+
+def test_enqueue_rejects_when_full():
+    async def scenario():
+        async def handler(message, phone_number):
+            await asyncio.sleep(1)
+
+        queue = MessageQueue(handler, max_concurrency=1, max_size=2)
+        queue.start()
+        queue.enqueue({"id": "1"}, "1")
+        queue.enqueue({"id": "2"}, "2")
+        try:
+            queue.enqueue({"id": "3"}, "3")
+        except QueueFullError:
+            rejected = True
+        else:
+            rejected = False
+        await queue.stop(timeout=0)
+        return rejected
+
+    assert asyncio.run(scenario())
@@ -0,0 +1,11 @@
+from datetime import datetime
+
+from app.services.patients import new_record_id, record_id_prefix
+
+
+def test_record_ids_in_the_same_millisecond_sort_in_creation_order():
+    created_at = datetime(2024, 1, 1, 12, 0, 0)
+    ids = [new_record_id("1", created_at) for _ in range(50)]
+    assert ids == sorted(ids)
+    assert len(set(ids)) == len(ids)
+    assert all(record_id.startswith(record_id_prefix("1")) for record_id in ids)
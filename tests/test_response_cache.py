@@ -0,0 +1,53 @@
+import asyncio
+
+from app.services.history_compactor import HistoryCompactor
+from app.services.response_cache import (
+    SemanticResponseCache,
+    context_fingerprint,
+    is_self_contained,
+)
+
+
+class SummaryRedis:
+    def __init__(self):
+        self.hashes = {}
+
+    async def hget(self, key, field):
+        return self.hashes.get(key, {}).get(field)
+
+
+def test_same_standalone_question_on_next_turn_hits():
+    async def scenario():
+        redis = SummaryRedis()
+        compactor = HistoryCompactor(redis, chat_store=None, llm=None)
+        cache = SemanticResponseCache(threshold=0.9)
+        entities = ["asthma", "salbutamol"]
+        query = "what is a normal resting heart rate"
+        vector = [0.6, 0.8, 0.0]
+
+        # Turn 1: miss, then the reply is stored
+        fingerprint = context_fingerprint(await compactor.get_summary("1"), entities)
+        assert cache.lookup("1", fingerprint, vector) is None
+        cache.store("1", fingerprint, query, vector, "60 to 100 beats per minute.")
+
+        # Turn 2: the raw turns changed but the summary and entities did not
+        fingerprint = context_fingerprint(await compactor.get_summary("1"), entities)
+        reply = cache.lookup("1", fingerprint, vector)
+
+        # After a summary refresh the context has moved on
+        redis.hashes[compactor.summary_key("1")] = {"text": "Patient has a cold."}
+        fingerprint = context_fingerprint(await compactor.get_summary("1"), entities)
+        return reply, cache.lookup("1", fingerprint, vector), cache
+
+    reply, after_refresh, cache = asyncio.run(scenario())
+    assert reply == "60 to 100 beats per minute."
+    assert after_refresh is None
+    assert (cache.hits, cache.misses, cache.stores) == (1, 2, 1)
+
+
+def test_follow_ups_are_not_self_contained():
+    assert is_self_contained("what is a normal resting heart rate")
+    assert is_self_contained("Can I take ibuprofen with food?")
+    assert not is_self_contained("can I take it with food")
+    assert not is_self_contained("Is that dangerous?")
+    assert not is_self_contained("what about the same dose for them")
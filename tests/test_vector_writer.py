@@ -0,0 +1,33 @@
+import asyncio
+
+from app.services.vector_writer import VectorWriter
+
+
+class RecordingIndex:
+    def __init__(self):
+        self.upserts = []
+
+    def upsert(self, vectors, namespace=""):
+        self.upserts.append((namespace, list(vectors)))
+
+
+def _vector(i):
+    return {"id": f"v{i}", "values": [1.0, 0.0], "metadata": {"phone_number": "1"}}
+
+
+def test_close_returns_after_periodic_flush():
+    async def scenario():
+        index = RecordingIndex()
+        writer = VectorWriter(index, batch_size=10, flush_interval_ms=5)
+        writer.start()
+        writer.add(_vector(1))
+        # Let several periodic flushes run
+        await asyncio.sleep(0.1)
+        writer.add(_vector(2))
+        await asyncio.wait_for(writer.close(), timeout=2)
+        return index, writer
+
+    index, writer = asyncio.run(scenario())
+    assert writer.flushed == 2
+    assert not writer._inflight
+    assert sorted(v["id"] for _, chunk in index.upserts for v in chunk) == ["v1", "v2"]